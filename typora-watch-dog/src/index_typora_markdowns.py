@@ -45,127 +45,211 @@ import json
 import os
 import random
 import re
+import shutil
+import stat
+import subprocess
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from typing import Optional, Tuple
 
+from util.io_util import iter_files_by_extension
 from util.logger import write_log
 
+# 可选依赖：orjson 读写 JSON 比标准库快得多，未安装时回退到 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 可选依赖：send2trash 跨平台移动到废纸篓，未安装时使用系统命令
+try:
+    from send2trash import send2trash
+except ImportError:
+    send2trash = None
+
 # 环境变量名称
 TYPORA_WORKSPACE_ENV = 'TYPORA_WORKSPACE'
 
-
-def _find_files_by_extension(directory: str, extension: str) -> list[str]:
-    """递归查找指定目录下所有指定扩展名的文件"""
-    file_list = []
-    for entry in os.scandir(directory):
-        if entry.is_file() and entry.name.endswith(f'.{extension}'):
-            file_list.append(entry.path)
-        elif entry.is_dir():
-            file_list.extend(_find_files_by_extension(entry.path, extension))
-    return file_list
+# 遍历工作空间时跳过的目录（图片资源、索引、版本库等不会包含需要索引的 Markdown）
+# 另外所有以 . 开头的隐藏目录也会被跳过
+SKIP_DIR_NAMES = frozenset({'.assets', '.index', '.git', 'node_modules'})
+
+# 索引缓存 {index_path: _IndexCache}，避免批量处理时每个文件都重新解析 JSON
+# 单文件的公共 API 每次调用前都会检查索引文件是否被外部修改（见 _IndexCache.refresh）
+_INDEX_CACHES: dict[str, _IndexCache] = {}
+# 保护索引缓存内容的锁（批量处理时多个线程会并发修改索引）
+_INDEX_LOCK = threading.Lock()
+# 读取 umask 时需要临时修改进程的 umask，加锁保证同一时刻只有一个线程在读取
+_UMASK_LOCK = threading.Lock()
+
+# 解析 front matter 时读取的文件头部字节数，front matter 通常远小于该值
+_FM_HEAD_SIZE = 8192
+# front matter 整体匹配：文件开头的 --- 行到下一处 \n---（非贪婪，只扫描头部）
+# 紧跟的第二行就是 --- 时为空 front matter，此时分组 1 为 None
+_FM_RE = re.compile(rb'\A---[ \t]*\r?\n(?:---|(.*?)\r?\n---)', re.DOTALL)
+# front matter 字段匹配：每行 key: value，去掉 key/value 首尾空白
+_FIELD_RE = re.compile(rb'^[ \t]*([^:\n]+?)[ \t]*:[ \t]*(.*?)[ \t\r]*$', re.MULTILINE)
+# 需要随路径变化刷新的两个字段所在的整行（不含行尾换行符），分组 1 为字段值
+_ROOT_URL_LINE_RE = re.compile(rb'^typora-watch-dog-root-url:[ \t]*([^\r\n]*)', re.MULTILINE)
+_COPY_TO_LINE_RE = re.compile(rb'^typora-watch-dog-copy-images-to:[ \t]*([^\r\n]*)', re.MULTILINE)
+# 单独提取 serial 字段值，判断是否需要改写时无需解析全部字段
+_SERIAL_RE = re.compile(rb'^[ \t]*serial[ \t]*:[ \t]*([^\r\n]*)', re.MULTILINE)
+
+# serial 字符表（tuple 供 random.choices 直接按下标取值）
+_LETTERS = tuple('abcdefghijklmnopqrstuvwxyz')
+_ALNUM = _LETTERS + tuple('0123456789')
+# 模块级随机数生成器，只在导入时初始化一次
+_RNG = random.Random()
 
 
 def _generate_serial() -> str:
     """生成8位唯一标识符，首位字母，其余7位字母数字混合"""
-    letters = 'abcdefghijklmnopqrstuvwxyz'
-    alnum = letters + '0123456789'
     # 第一位从 26 个小写字母中随机选择
-    first_char = random.choice(letters)
-    # 其余 7 位从 36 个字符（26字母+10数字）中随机选择
-    remaining = ''.join(random.choice(alnum) for _ in range(7))
+    first_char = _LETTERS[_RNG.randrange(26)]
+    # 其余 7 位从 36 个字符（26字母+10数字）中一次性随机选择
+    remaining = ''.join(_RNG.choices(_ALNUM, k=7))
     return first_char + remaining
 
 
-def _generate_unique_serial(workspace_path: str) -> str:
+class _SerialAllocator:
     """
-    生成唯一的 serial，确保不在索引文件中重复
-
-    Args:
-        workspace_path: 工作空间路径
+    serial 分配器，每次运行（批量处理或单文件调用）创建一个
 
-    Returns:
-        唯一的8位 serial
+    只在确定需要写入新 serial 时才调用 allocate，文件已有 serial 的常见情况不会触发。
+    直接使用内存中缓存的索引做成员判断，重试时不会重新读取索引文件；
+    已分配的 serial 记录在 _reserved 中，保证线程池中多个线程并发处理时不会分配出重复的 serial。
     """
-    index_path = _get_index_file_path(workspace_path)
-    index_data = _read_index_file(index_path)
 
-    while True:
-        serial = _generate_serial()
-        if serial not in index_data:
-            return serial
-        # 如果已存在，继续循环生成新的
+    def __init__(self, index: _IndexCache):
+        """
+        Args:
+            index: 工作空间的索引缓存
+        """
+        self._index = index
+        self._reserved: set[str] = set()
 
+    def allocate(self) -> str:
+        """生成唯一的 8 位 serial，确保不在索引和本次已分配的 serial 中重复"""
+        with _INDEX_LOCK:
+            forward = self._index.data
 
-def _calculate_relative_path(workspace_path: str, file_path: str) -> str:
-    """
-    计算文件相对于工作空间的 ../ 形式路径
-    例如: /workspace/__laomst_blogs__/000-AI编程专题/file.md -> ../../
-    """
-    abs_workspace = os.path.abspath(workspace_path)
-    abs_file = os.path.abspath(file_path)
+            while True:
+                serial = _generate_serial()
+                if serial not in forward and serial not in self._reserved:
+                    self._reserved.add(serial)
+                    return serial
+                # 如果已存在，继续循环生成新的
 
-    if not abs_file.startswith(abs_workspace):
-        raise ValueError(f'文件 {file_path} 不在工作空间 {workspace_path} 内')
 
-    # 获取文件所在目录相对于工作空间的深度
-    relative = abs_file[len(abs_workspace):].lstrip(os.sep)
-    # 去掉文件名，只保留目录部分
-    dir_path = os.path.dirname(relative)
+def _workspace_relative(abs_workspace: str, abs_file: str) -> str:
+    """
+    截取文件相对于工作空间的部分（以分隔符开头）
 
-    # 计算需要向上几级（目录深度）
-    if dir_path == '.' or dir_path == '':
-        return ''
+    两个参数都必须是已规范化的绝对路径，调用方负责只做一次 abspath。
+    以"工作空间 + 分隔符"作为前缀判断，避免 /ws 误匹配 /ws2/...
+    """
+    workspace_root = abs_workspace.rstrip(os.sep)
+    if not abs_file.startswith(workspace_root + os.sep):
+        raise ValueError(f'文件 {abs_file} 不在工作空间 {abs_workspace} 内')
+    return abs_file[len(workspace_root):]
 
-    depth = len([p for p in dir_path.split(os.sep) if p])
-    return '../' * depth
 
+class _FileContext:
+    """
+    单个文件处理过程中用到的路径信息
+
+    工作空间和文件路径都只做一次 abspath，两种相对路径形式也只计算一次，
+    之后由 _add_front_matter_to_file、_update_index 等函数直接复用。
+
+    Attributes:
+        abs_workspace: 工作空间的绝对路径
+        abs_file: 文件的绝对路径
+        index: 工作空间的索引缓存
+        rel_for_url: ../ 形式的相对路径，用于 typora-watch-dog-root-url
+        rel_for_index: 以 / 开头的相对路径，用于写入索引，同时用于日志显示
+        allocator: serial 分配器，批量处理时所有文件共用同一个
+        logs: 批量处理时收集该文件的日志，处理完后一次性输出，避免并发处理的文件日志互相穿插；
+            为 None 时直接输出
+    """
 
-def _has_front_matter(content: str) -> bool:
-    """检查文件是否已有 YAML front matter"""
-    return content.startswith('---')
+    __slots__ = ('abs_workspace', 'abs_file', 'index', 'rel_for_url', 'rel_for_index', 'allocator', 'logs')
+
+    def __init__(self, abs_workspace: str, abs_file: str, index: Optional[_IndexCache] = None,
+                 allocator: Optional[_SerialAllocator] = None):
+        """
+        Args:
+            abs_workspace: 已规范化的工作空间绝对路径
+            abs_file: 已规范化的文件绝对路径
+            index: 索引缓存，批量处理时由调用方传入以免重复查找
+            allocator: serial 分配器，未传入时为该文件单独创建
+
+        Raises:
+            ValueError: 文件不在工作空间内
+        """
+        relative = _workspace_relative(abs_workspace, abs_file)
+        self.abs_workspace = abs_workspace
+        self.abs_file = abs_file
+        self.index = index or _get_index_cache(_get_index_file_path(abs_workspace))
+        # 去掉开头的分隔符后，剩余分隔符的个数即为文件所在目录的深度
+        self.rel_for_url = '../' * (relative.count(os.sep) - 1)
+        self.rel_for_index = relative if relative.startswith('/') else '/' + relative
+        self.allocator = allocator or _SerialAllocator(self.index)
+        self.logs: Optional[list[str]] = None
+
+    def log(self, msg: str) -> None:
+        """输出或收集该文件的处理日志"""
+        if self.logs is None:
+            write_log(msg)
+        else:
+            self.logs.append(msg)
 
 
-def _get_existing_front_matter(content: str) -> Optional[Tuple[str, str]]:
+def _get_existing_front_matter(content: bytes) -> Optional[Tuple[bytes, bytes]]:
     """
-    获取现有的 front matter
-    返回: (front_matter, remaining_content) 或 None
-    """
-    if not content.startswith('---'):
-        return None
+    定位现有的 front matter
 
-    # 查找第二个 ---（跳过开头的 ---）
-    # 第二个 --- 的位置应该在 content[4:] 中查找
-    rest = content[4:]
-    second_dash_start = rest.find('\n---')
+    一次正则匹配定位 front matter，字段留给调用方按需提取：
+    判断是否需要改写时只用 _extract_*_from_front_matter 取出单个字段，
+    确定要重建时才用 _parse_front_matter_fields 解析全部字段。
+    调用方只需以返回值是否为 None 作为唯一判断，无需再单独检测 front matter 是否存在。
 
-    if second_dash_start == -1:
+    返回:
+        - None: 没有 front matter
+        - (front_matter, remaining_content): 有 front matter（可能为空，即 --- 后紧跟 ---）
+    """
+    match = _FM_RE.match(content)
+    if match is None:
         return None
 
-    # 第二个 --- 在 content 中的结束位置（包含 --- 和前面的换行符）
-    front_matter_end = 4 + second_dash_start + 4
+    remaining_content = content[match.end():].lstrip(b'\r\n')
+    return match.group(0), remaining_content
 
-    front_matter = content[:front_matter_end]
-    remaining_content = content[front_matter_end:].lstrip('\n')
-    return front_matter, remaining_content
 
-
-def _parse_front_matter(front_matter: str) -> dict:
+def _parse_front_matter_fields(front_matter: bytes) -> dict:
     """
-    解析 front matter 为字典
-    保留所有字段
+    用一次 findall 取出 front matter 的全部字段
+
+    只有 front matter 部分会被解码为字符串，正文保持原始字节。
+    首尾的 --- 行不含冒号，不会被当作字段。
     """
-    fields = {}
-    # 跳过开头的 --- 和结尾的 ---
-    lines = front_matter.split('\n')
-    for line in lines[1:-1]:  # 跳过第一个 --- 和最后一个 ---
-        line = line.strip()
-        if line and ':' in line:
-            key, value = line.split(':', 1)
-            fields[key.strip()] = value.strip()
-    return fields
+    return {
+        key.decode('utf-8'): value.decode('utf-8')
+        for key, value in _FIELD_RE.findall(front_matter)
+    }
+
+
+def _search_front_matter_field(pattern: re.Pattern, front_matter: bytes) -> Optional[str]:
+    """用预编译的单字段正则提取字段值（去掉行尾空白），字段不存在时返回 None"""
+    match = pattern.search(front_matter)
+    if match is None:
+        return None
+    return match.group(1).rstrip().decode('utf-8')
 
 
 def _build_front_matter(fields: dict) -> str:
@@ -180,20 +264,43 @@ def _build_front_matter(fields: dict) -> str:
     return '\n'.join(lines)
 
 
-def _extract_serial_from_front_matter(front_matter: str) -> Optional[str]:
-    """从现有的 front matter 中提取 serial"""
-    fields = _parse_front_matter(front_matter)
-    serial = fields.get('serial', '')
+def _patch_front_matter_urls(front_matter: bytes, root_url: str, copy_images_to: str) -> Optional[bytes]:
+    """
+    在原始 front matter 上直接替换 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to 两行
+
+    其他行原样保留，省去解析为字典再重建的往返。
+    任一字段行不存在时返回 None，由调用方回退到按字典重建。
+    """
+    root_line = f'typora-watch-dog-root-url: {root_url}'.encode('utf-8')
+    copy_line = f'typora-watch-dog-copy-images-to: {copy_images_to}'.encode('utf-8')
+    patched, root_count = _ROOT_URL_LINE_RE.subn(lambda _: root_line, front_matter, count=1)
+    patched, copy_count = _COPY_TO_LINE_RE.subn(lambda _: copy_line, patched, count=1)
+    if not root_count or not copy_count:
+        return None
+    return patched
+
+
+def _extract_serial_from_front_matter(front_matter: bytes) -> Optional[str]:
+    """从 front matter 中提取 serial（只匹配 serial 一行，不解析其他字段）"""
+    serial = _search_front_matter_field(_SERIAL_RE, front_matter)
     # 只需判断 serial 非空
-    if serial and serial.strip():
-        return serial
-    return None
+    return serial or None
+
 
+def _extract_typora_root_url_from_front_matter(front_matter: bytes) -> Optional[str]:
+    """从 front matter 中提取 typora-watch-dog-root-url"""
+    return _search_front_matter_field(_ROOT_URL_LINE_RE, front_matter)
 
-def _extract_typora_root_url_from_front_matter(front_matter: str) -> Optional[str]:
-    """从现有的 front matter 中提取 typora-watch-dog-root-url"""
-    fields = _parse_front_matter(front_matter)
-    return fields.get('typora-watch-dog-root-url')
+
+def _extract_copy_images_to_from_front_matter(front_matter: bytes) -> Optional[str]:
+    """从 front matter 中提取 typora-watch-dog-copy-images-to"""
+    return _search_front_matter_field(_COPY_TO_LINE_RE, front_matter)
+
+
+def _detect_newline(head: bytes) -> bytes:
+    """按文件头部第一个换行判断文件使用的换行符（CRLF 或 LF），没有换行时默认 LF"""
+    pos = head.find(b'\n')
+    return b'\r\n' if pos > 0 and head[pos - 1] == 0x0d else b'\n'
 
 
 def _create_front_matter(serial: str, relative_path: str) -> str:
@@ -217,77 +324,213 @@ def _create_front_matter(serial: str, relative_path: str) -> str:
     return _build_front_matter(fields)
 
 
-def _calculate_file_relative_path(workspace_path: str, file_path: str) -> str:
-    """
-    计算文件相对于工作空间的路径（以 / 开头）
-    例如: /workspace/vibe-coding/file.md -> /vibe-coding/file.md
-    """
-    abs_workspace = os.path.abspath(workspace_path)
-    abs_file = os.path.abspath(file_path)
-
-    if not abs_file.startswith(abs_workspace):
-        raise ValueError(f'文件 {file_path} 不在工作空间 {workspace_path} 内')
-
-    # 获取文件相对于工作空间的路径
-    relative = abs_file[len(abs_workspace):]
-    # 确保以 / 开头
-    if not relative.startswith('/'):
-        relative = '/' + relative
-    return relative
-
-
 def _get_index_file_path(workspace_path: str) -> str:
     """获取索引文件路径（工作空间根目录下的 .index/path_index.json）"""
     return os.path.join(workspace_path, '.index', 'path_index.json')
 
 
-def _read_index_file(index_path: str) -> dict:
-    """读取索引文件，如果不存在返回空字典"""
+def _index_file_signature(index_path: str) -> Optional[Tuple[int, int]]:
+    """索引文件的 (修改时间, 大小)，用于判断文件是否被外部修改；文件不存在时返回 None"""
+    try:
+        st = os.stat(index_path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_index_file(index_path: str) -> dict:
+    """从磁盘读取索引文件，如果不存在返回空字典"""
     if not os.path.exists(index_path):
         return {}
     try:
-        with open(index_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(index_path, 'rb') as f:
+            data = f.read()
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
     except json.JSONDecodeError:
+        # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
         write_log(f'警告: 索引文件格式错误，将创建新的索引文件')
         return {}
 
 
+class _IndexCache:
+    """
+    单个索引文件的内存缓存
+
+    同一索引文件只在首次访问时解析 JSON，之后所有读写都在内存中的同一个字典上进行，
+    修改后通过 mark_dirty 标记，再由 flush 统一写回磁盘。
+    data、reverse 及修改操作需在持有 _INDEX_LOCK 时进行。
+
+    长期运行的监控服务中，索引文件可能被其他进程修改（手动运行批量索引、同步工具等），
+    单文件操作前调用 refresh，文件的修改时间或大小与加载时不同就丢弃缓存重新加载，
+    避免用过期的内存内容覆盖外部修改。
+
+    Attributes:
+        path: 索引文件路径
+        dirty: 内存中是否有尚未写回磁盘的修改
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 索引文件路径
+        """
+        self.path = path
+        self.dirty = False
+        self._data: Optional[dict] = None
+        self._reverse: Optional[dict[str, list[str]]] = None
+        # 加载或写回时索引文件的 (修改时间, 大小)
+        self._signature: Optional[Tuple[int, int]] = None
+
+    @property
+    def data(self) -> dict:
+        """正向索引 serial -> local_path，首次访问时从磁盘加载"""
+        if self._data is None:
+            # 先取签名再读取：两者之间文件被修改时，下次 refresh 会再次重新加载
+            self._signature = _index_file_signature(self.path)
+            self._data = _load_index_file(self.path)
+        return self._data
+
+    @property
+    def reverse(self) -> dict[str, list[str]]:
+        """
+        反向索引 local_path -> [serial, ...]，仅存在于内存中，不写入磁盘
+
+        首次访问时由正向索引一次性构建，之后与正向索引同步维护，
+        用于按路径查找 serial 时避免遍历整个索引。
+        """
+        if self._reverse is None:
+            reverse = defaultdict(list)
+            for serial, path in self.data.items():
+                reverse[path].append(serial)
+            self._reverse = reverse
+        return self._reverse
+
+    def refresh(self) -> None:
+        """索引文件在加载后被外部修改时丢弃内存缓存，下次访问时重新加载（有未写回的修改时不丢弃）"""
+        with _INDEX_LOCK:
+            if self._data is not None and not self.dirty \
+                    and _index_file_signature(self.path) != self._signature:
+                self._data = None
+                self._reverse = None
+
+    def mark_dirty(self) -> None:
+        """标记索引已在内存中修改，等待写回"""
+        self.dirty = True
+
+    def flush(self) -> None:
+        """如果索引有未写回的修改，将其写入磁盘"""
+        with _INDEX_LOCK:
+            if self.dirty:
+                _write_index_file(self.path, self._data)
+                self._signature = _index_file_signature(self.path)
+                self.dirty = False
+
+
+def _get_index_cache(index_path: str) -> _IndexCache:
+    """获取索引文件对应的缓存，不存在时创建（此时还不会读取磁盘）"""
+    cache = _INDEX_CACHES.get(index_path)
+    if cache is None:
+        cache = _INDEX_CACHES.setdefault(index_path, _IndexCache(index_path))
+    return cache
+
+
 def _write_index_file(index_path: str, index_data: dict) -> None:
-    """写入索引文件"""
-    # 确保目录存在
-    index_dir = os.path.dirname(index_path)
-    if index_dir and not os.path.exists(index_dir):
-        os.makedirs(index_dir, exist_ok=True)
-    with open(index_path, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, ensure_ascii=False, indent=2)
+    """写入索引文件（原子替换，写入中途出错不会损坏已有索引）"""
+    # 确保目录存在（exist_ok 一次调用即可，无需先判断）
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    _atomic_write_bytes(index_path, _dumps_index(index_data))
+
 
+def _dumps_index(index_data: dict) -> bytes:
+    """将索引序列化为 UTF-8 编码的 JSON（缩进 2 格，中文不转义），优先使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(index_data, option=orjson.OPT_INDENT_2)
+    return json.dumps(index_data, ensure_ascii=False, indent=2).encode('utf-8')
 
-def _update_index(workspace_path: str, serial: str, file_path: str) -> None:
+
+def _update_index(index: _IndexCache, serial: str, local_path: str) -> None:
     """
-    更新索引文件，添加或更新指定 serial 的记录
+    更新索引，添加或更新指定 serial 的记录
+
+    仅修改内存中的索引并标记为待写回，由调用方在合适的时机调用 index.flush()。
 
     Args:
-        workspace_path: 工作空间路径
+        index: 工作空间的索引缓存
         serial: 文章的 serial
-        file_path: markdown 文件的绝对路径
+        local_path: 文件相对于工作空间的路径（以 / 开头，见 _FileContext.rel_for_index）
+    """
+    with _INDEX_LOCK:
+        # 读取现有索引
+        index_data = index.data
+        reverse = index.reverse
+
+        old_path = index_data.get(serial)
+        if old_path == local_path:
+            # 索引已是最新，无需标记写回
+            return
+
+        # 同步维护反向索引：从旧路径下移除该 serial
+        if old_path is not None:
+            old_serials = reverse.get(old_path)
+            if old_serials and serial in old_serials:
+                old_serials.remove(serial)
+                if not old_serials:
+                    del reverse[old_path]
+
+        # 更新索引（简化结构：serial 直接对应 localPath）
+        index_data[serial] = local_path
+        reverse[local_path].append(serial)
+        index.mark_dirty()
+
+
+def _current_umask() -> int:
+    """读取进程当前的 umask（只能通过设置再恢复的方式读取，加锁避免并发调用互相干扰）"""
+    with _UMASK_LOCK:
+        mask = os.umask(0)
+        os.umask(mask)
+    return mask
+
+
+def _atomic_write_bytes(path: str, data: bytes) -> None:
     """
-    index_path = _get_index_file_path(workspace_path)
+    原子写入文件：先写入同目录下的临时文件，再用 os.replace 替换目标文件
 
-    # 读取现有索引
-    index_data = _read_index_file(index_path)
+    写入中途出错不会留下半截文件；替换前沿用原文件的权限位，
+    目标文件不存在时按 0o666 & ~umask 设置（与 open 新建文件一致，mkstemp 默认是 0600）。
+    临时文件以 . 开头、.tmp 结尾，不会被当作 Markdown 文件处理。
+    替换会生成新的 inode（断开符号链接/硬链接、丢失属主和扩展属性），只用于程序自己管理的索引文件，
+    用户的笔记文件用 _rewrite_file_in_place 原地改写。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+            except FileNotFoundError:
+                mode = 0o666 & ~_current_umask()
+            os.fchmod(f.fileno(), mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
-    # 计算文件的相对路径
-    local_path = _calculate_file_relative_path(workspace_path, file_path)
 
-    # 更新索引（简化结构：serial 直接对应 localPath）
-    index_data[serial] = local_path
+def _rewrite_file_in_place(path: str, data: bytes) -> None:
+    """
+    原地改写文件内容：以 r+b 打开（跟随符号链接写入真实文件）、覆盖写入后截断
 
-    # 写回索引文件
-    _write_index_file(index_path, index_data)
+    保持文件的 inode 不变，符号链接、硬链接、属主、权限和扩展属性都不受影响，
+    也不会让监控服务收到临时文件移动到笔记路径的事件。
+    """
+    with open(path, 'r+b') as f:
+        f.write(data)
+        f.truncate()
 
 
-def _add_front_matter_to_file(file_path: str, workspace_path: str) -> bool:
+def _add_front_matter_to_file(ctx: _FileContext) -> bool:
     """
     为单个文件添加或更新 front matter
     返回: 是否进行了修改
@@ -296,97 +539,119 @@ def _add_front_matter_to_file(file_path: str, workspace_path: str) -> bool:
     1. 无 matter -> 全量补充
     2. 有 matter 但无 serial -> 生成 serial，重新计算 typora-watch-dog-root-url，保留其他字段
     3. 有 matter 且有 serial -> 保留 serial 和其他字段，重新计算 typora-watch-dog-root-url
-    """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    relative_path = _calculate_relative_path(workspace_path, file_path)
 
-    if _has_front_matter(content):
-        # 有 front matter，解析并保留所有字段
-        existing = _get_existing_front_matter(content)
-        if not existing:
-            return False
-
-        front_matter, remaining = existing
-        fields = _parse_front_matter(front_matter)
-        existing_serial = _extract_serial_from_front_matter(front_matter)
-        existing_url = fields.get('typora-watch-dog-root-url')
-        existing_copy_url = fields.get('typora-watch-dog-copy-images-to')
-
-        # 计算新的 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to
-        if existing_serial:
-            # 使用现有的 serial 计算新的值
-            new_typora_root_url = relative_path
-            url_prefix = existing_serial[:1]
-            if relative_path:
-                new_typora_copy_images_to = f'{relative_path}.assets/{url_prefix}/{existing_serial}'
-            else:
-                new_typora_copy_images_to = f'.assets/{url_prefix}/{existing_serial}'
+    只读取文件头部来解析 front matter，无需修改时直接返回，
+    确定要改写时才读取剩余正文；新旧 front matter 长度相同时直接原地覆盖文件开头，正文不读也不写。
 
-            # 检查是否需要更新 front matter
-            if existing_url == new_typora_root_url and existing_copy_url == new_typora_copy_images_to:
-                # front matter 无需更新，但要确保文件在索引中
-                write_log(f'  front matter 无需更新，检查索引...')
-                _update_index(workspace_path, existing_serial, file_path)
+    Args:
+        ctx: 文件处理上下文，提供预先计算好的路径信息
+    """
+    relative_path = ctx.rel_for_url
+    # 是否只需原地覆盖文件开头的 front matter
+    in_place = False
+
+    with open(ctx.abs_file, 'rb') as f:
+        head = f.read(_FM_HEAD_SIZE)
+        # 新写入的 front matter 行和分隔空行沿用文件原有的换行符，避免 CRLF 文件改写后换行符混用
+        newline = _detect_newline(head)
+        existing = _get_existing_front_matter(head)
+        if existing is None and head.startswith(b'---'):
+            if len(head) < _FM_HEAD_SIZE:
+                # 已读到文件末尾仍找不到结束标记，无法安全解析，保持原样
+                return False
+            # front matter 超出头部范围，读入全文后再解析
+            head += f.read()
+            existing = _get_existing_front_matter(head)
+            if existing is None:
                 return False
 
-            # 更新 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to，保留所有其他字段
-            fields['typora-watch-dog-root-url'] = new_typora_root_url
-            fields['typora-watch-dog-copy-images-to'] = new_typora_copy_images_to
-            new_front_matter = _build_front_matter(fields)
-
-            new_content = new_front_matter + '\n\n' + remaining
-
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-
-            # 更新索引
-            _update_index(workspace_path, existing_serial, file_path)
-
-            write_log(f'  更新 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to: serial={existing_serial}')
-            return True
-        else:
-            # 没有 serial，生成新的，保留所有其他字段
-            serial = _generate_unique_serial(workspace_path)
-            fields['serial'] = serial
-
-            # 计算 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to
-            typora_root_url = relative_path
-            url_prefix = serial[:1]
-            if relative_path:
-                typora_copy_images_to = f'{relative_path}.assets/{url_prefix}/{serial}'
+        if existing is not None:
+            # 有 front matter（可能为空），保留所有字段
+            front_matter, remaining = existing
+            existing_serial = _extract_serial_from_front_matter(front_matter)
+
+            # 计算新的 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to
+            if existing_serial:
+                # 使用现有的 serial 计算新的值
+                serial = existing_serial
+                new_typora_root_url = relative_path
+                url_prefix = existing_serial[:1]
+                if relative_path:
+                    new_typora_copy_images_to = f'{relative_path}.assets/{url_prefix}/{existing_serial}'
+                else:
+                    new_typora_copy_images_to = f'.assets/{url_prefix}/{existing_serial}'
+
+                # 检查是否需要更新 front matter（只提取这两个字段，不解析整个 front matter）
+                existing_url = _extract_typora_root_url_from_front_matter(front_matter)
+                existing_copy_url = _extract_copy_images_to_from_front_matter(front_matter)
+                if existing_url == new_typora_root_url and existing_copy_url == new_typora_copy_images_to:
+                    # front matter 无需更新（不再读取正文），但要确保文件在索引中
+                    ctx.log(f'  front matter 无需更新，检查索引...')
+                    _update_index(ctx.index, existing_serial, ctx.rel_for_index)
+                    return False
+
+                # 更新 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to，保留所有其他字段
+                new_front_matter = _patch_front_matter_urls(
+                    front_matter, new_typora_root_url, new_typora_copy_images_to)
+                if new_front_matter is None:
+                    # 字段行缺失，回退到按字典重建
+                    fields = _parse_front_matter_fields(front_matter)
+                    fields['typora-watch-dog-root-url'] = new_typora_root_url
+                    fields['typora-watch-dog-copy-images-to'] = new_typora_copy_images_to
+                    new_front_matter = _build_front_matter(fields).encode('utf-8').replace(b'\n', newline)
+
+                if new_front_matter == front_matter:
+                    # 字段写法与比较规则不一致（如重复字段）时可能出现：
+                    # 计算结果与原内容一致，不改写文件，避免无谓地更新 mtime
+                    _update_index(ctx.index, existing_serial, ctx.rel_for_index)
+                    return False
+
+                # front matter 及其后的分隔空行与整体改写结果逐字节同长时，可以原地覆盖
+                # （remaining 非空说明分隔空行已在头部内结束）
+                prefix_len = len(head) - len(remaining)
+                in_place = bool(remaining) and prefix_len == len(new_front_matter) + 2 * len(newline) \
+                    and head[len(front_matter):prefix_len] == newline * 2
+                message = f'  更新 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to: serial={existing_serial}'
             else:
-                typora_copy_images_to = f'.assets/{url_prefix}/{serial}'
-            fields['typora-watch-dog-root-url'] = typora_root_url
-            fields['typora-watch-dog-copy-images-to'] = typora_copy_images_to
-
-            new_front_matter = _build_front_matter(fields)
-            new_content = new_front_matter + '\n\n' + remaining
-
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-
-            # 更新索引
-            _update_index(workspace_path, serial, file_path)
-
-            write_log(f'  添加 serial、typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to: serial={serial} (保留其他字段)')
-            return True
+                # 没有 serial，生成新的，保留所有其他字段
+                serial = ctx.allocator.allocate()
+                fields = _parse_front_matter_fields(front_matter)
+                fields['serial'] = serial
+
+                # 计算 typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to
+                typora_root_url = relative_path
+                url_prefix = serial[:1]
+                if relative_path:
+                    typora_copy_images_to = f'{relative_path}.assets/{url_prefix}/{serial}'
+                else:
+                    typora_copy_images_to = f'.assets/{url_prefix}/{serial}'
+                fields['typora-watch-dog-root-url'] = typora_root_url
+                fields['typora-watch-dog-copy-images-to'] = typora_copy_images_to
+                new_front_matter = _build_front_matter(fields).encode('utf-8').replace(b'\n', newline)
+                message = f'  添加 serial、typora-watch-dog-root-url 和 typora-watch-dog-copy-images-to: serial={serial} (保留其他字段)'
+
+            if not in_place:
+                # 需要整体改写时才读取剩余正文（头部恰好截断在分隔空行处时再去掉一次前导换行）
+                remaining = (remaining + f.read()).lstrip(b'\r\n')
+        else:
+            # 没有 front matter，添加新的
+            serial = ctx.allocator.allocate()
+            new_front_matter = _create_front_matter(serial, relative_path).encode('utf-8').replace(b'\n', newline)
+            message = f'  添加 front matter: serial={serial}'
+            remaining = head + f.read()
+
+    if in_place:
+        # 长度不变，只覆盖 front matter 本身，文件其余部分保持原样
+        with open(ctx.abs_file, 'r+b') as f:
+            f.write(new_front_matter)
     else:
-        # 没有 front matter，添加新的
-        serial = _generate_unique_serial(workspace_path)
-        new_front_matter = _create_front_matter(serial, relative_path)
+        _rewrite_file_in_place(ctx.abs_file, new_front_matter + newline * 2 + remaining)
 
-        new_content = new_front_matter + '\n\n' + content
+    # 更新索引
+    _update_index(ctx.index, serial, ctx.rel_for_index)
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-
-        # 更新索引
-        _update_index(workspace_path, serial, file_path)
-
-        write_log(f'  添加 front matter: serial={serial}')
-        return True
+    ctx.log(message)
+    return True
 
 
 def _collect_markdown_files(paths: list[str], workspace_path: str) -> list[str]:
@@ -399,42 +664,71 @@ def _collect_markdown_files(paths: list[str], workspace_path: str) -> list[str]:
         workspace_path: 工作空间路径
 
     Returns:
-        符合条件的 markdown 文件列表
+        去重后的 markdown 文件列表（按输入路径和目录遍历顺序，不再排序；批量处理本身是并发的）
     """
     abs_workspace = os.path.abspath(workspace_path)
-    md_files = []
+    # 工作空间的规范形式（去除末尾的分隔符）和前缀只计算一次，循环内直接比较
+    normalized_workspace = abs_workspace.rstrip(os.sep)
+    workspace_prefix = normalized_workspace + os.sep
+    # 收集时直接去重（同一文件可能被多个输入路径覆盖），dict 的键保持首次出现的顺序
+    md_files: dict[str, None] = {}
 
     for path in paths:
         abs_path = os.path.abspath(path)
 
-        if not os.path.exists(abs_path):
+        # 只 stat 一次，之后根据 st_mode 判断类型，不再分别调用 exists/isfile/isdir
+        try:
+            mode = os.stat(abs_path).st_mode
+        except (OSError, ValueError):
+            # 与 os.path.exists 一致：权限不足、路径过长、含空字符等无法 stat 的情况也按不存在处理
             write_log(f'警告: 路径不存在，跳过: {path}')
             continue
 
         # 校验路径是否在工作空间内或就是工作空间本身
-        # 规范化路径后进行比较（去除末尾的分隔符）
+        # 以"工作空间 + 分隔符"作为前缀判断，避免 /ws 误匹配 /ws2/...
         normalized_path = abs_path.rstrip(os.sep)
-        normalized_workspace = abs_workspace.rstrip(os.sep)
 
-        if normalized_path != normalized_workspace and not normalized_path.startswith(normalized_workspace + os.sep):
+        if normalized_path != normalized_workspace and not normalized_path.startswith(workspace_prefix):
             write_log(f'错误: 路径不在工作空间内，跳过: {path}')
             write_log(f'  工作空间: {abs_workspace}')
             continue
 
-        if os.path.isfile(abs_path):
+        if stat.S_ISREG(mode):
             # 是文件
             if abs_path.endswith('.md'):
-                md_files.append(abs_path)
+                md_files[abs_path] = None
             else:
                 write_log(f'警告: 非 Markdown 文件，跳过: {path}')
-        elif os.path.isdir(abs_path):
+        elif stat.S_ISDIR(mode):
             # 是目录，递归查找所有 .md 文件
-            found = _find_files_by_extension(abs_path, 'md')
-            md_files.extend(found)
+            md_files.update(dict.fromkeys(
+                iter_files_by_extension(abs_path, 'md', SKIP_DIR_NAMES, skip_hidden_dirs=True)))
         else:
             write_log(f'警告: 无法识别的路径类型，跳过: {path}')
 
-    return md_files
+    return list(md_files)
+
+
+def _process_markdown_file(md_file: str, workspace: str, index: _IndexCache, allocator: _SerialAllocator) -> bool:
+    """
+    批量处理中的单个文件：添加或更新 front matter
+
+    多个文件并发处理，每个文件的日志先收集起来，处理结束（包括出错）时作为一条日志输出，
+    同一文件的日志不会和其他文件的日志穿插在一起。
+    """
+    # md_file 和 workspace 都已是绝对路径，相对路径只在构建上下文时计算一次
+    try:
+        ctx = _FileContext(workspace, md_file, index, allocator)
+    except ValueError:
+        # 文件不在工作空间内，显示绝对路径
+        write_log(f'处理: {md_file} (警告: 文件不在工作空间内)')
+        raise
+
+    ctx.logs = [f'处理: {ctx.rel_for_index}']
+    try:
+        return _add_front_matter_to_file(ctx)
+    finally:
+        write_log('\n'.join(ctx.logs))
 
 
 def main():
@@ -493,10 +787,6 @@ def main():
         write_log('未找到任何 Markdown 文件')
         sys.exit(0)
 
-    # 去重
-    md_files = list(set(md_files))
-    md_files.sort()
-
     write_log(f'工作空间: {workspace}')
     write_log(f'找到 {len(md_files)} 个 Markdown 文件\n')
 
@@ -504,24 +794,30 @@ def main():
     skipped_count = 0
     error_count = 0
 
-    for md_file in md_files:
-        # 尝试计算相对路径用于显示
-        try:
-            relative_path = _calculate_relative_path(workspace, md_file)
-            write_log(f'处理: {relative_path}')
-        except ValueError:
-            # 文件不在工作空间内，显示绝对路径
-            write_log(f'处理: {md_file} (警告: 文件不在工作空间内)')
+    # 每个文件的读取、解析、改写互相独立且以 I/O 为主，使用线程池并发处理；
+    # 共享的索引缓存由 _INDEX_LOCK 保护
+    index = _get_index_cache(_get_index_file_path(workspace))
+    # 本次运行的所有文件共用一个 serial 分配器
+    allocator = _SerialAllocator(index)
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_process_markdown_file, md_file, workspace, index, allocator): md_file
+            for md_file in md_files
+        }
+        for future in as_completed(futures):
+            try:
+                modified = future.result()
+                if modified:
+                    added_count += 1
+                else:
+                    skipped_count += 1
+            except Exception as e:
+                write_log(f'  错误: {futures[future]}: {e}')
+                error_count += 1
 
-        try:
-            modified = _add_front_matter_to_file(md_file, workspace)
-            if modified:
-                added_count += 1
-            else:
-                skipped_count += 1
-        except Exception as e:
-            write_log(f'  错误: {e}')
-            error_count += 1
+    # 所有文件处理完后统一写回索引
+    index.flush()
 
     write_log(f'\n处理完成!')
     write_log(f'  添加/更新: {added_count} 个文件')
@@ -558,6 +854,112 @@ def index_or_update_file(workspace_path: str, file_path: str) -> bool:
         >>> index_or_update_file('/workspace', '/workspace/notes/test.md')
         True
     """
+    ctx = _build_checked_context(workspace_path, file_path)
+
+    # 调用内部函数处理，单文件调用需立即写回索引
+    try:
+        return _add_front_matter_to_file(ctx)
+    finally:
+        ctx.index.flush()
+
+
+def index_rename(workspace_path: str, src_path: str, dest_path: str) -> bool:
+    """
+    处理 Markdown 文件的移动/重命名：更新目标文件的 front matter，并把索引记录从旧路径改指向新路径
+
+    与先 remove_from_index(src) 再 index_or_update_file(dest) 相比：
+    - 文件的 serial 记录直接改指向新路径，不会出现文件暂时不在索引中的窗口
+    - 索引只写回一次磁盘
+    旧路径下残留的其他 serial 记录（如文件的 serial 已变化）会一并移除。
+
+    Args:
+        workspace_path: 工作空间目录的绝对路径
+        src_path: 移动前的文件绝对路径（可以在工作空间外，此时等同于 index_or_update_file）
+        dest_path: 移动后的文件绝对路径
+
+    Returns:
+        bool: 是否进行了修改（front matter 或索引有变化）
+
+    Raises:
+        ValueError: 工作空间不存在、目标文件不在工作空间内或不是 Markdown 文件
+        FileNotFoundError: 目标文件不存在
+
+    示例:
+        >>> index_rename('/workspace', '/workspace/old/test.md', '/workspace/new/test.md')
+        True
+    """
+    ctx = _build_checked_context(workspace_path, dest_path)
+    index = ctx.index
+
+    try:
+        src_relative = _FileContext(ctx.abs_workspace, os.path.abspath(src_path), index).rel_for_index
+    except ValueError:
+        # 从工作空间外移入，旧路径不在索引中
+        src_relative = None
+
+    try:
+        modified = _add_front_matter_to_file(ctx)
+
+        # 文件自身的 serial 已由 _add_front_matter_to_file 改指向新路径，这里移除旧路径下残留的记录
+        if src_relative is not None and src_relative != ctx.rel_for_index:
+            with _INDEX_LOCK:
+                stale_serials = index.reverse.pop(src_relative, [])
+                for serial in stale_serials:
+                    index.data.pop(serial, None)
+                if stale_serials:
+                    index.mark_dirty()
+
+        return modified or index.dirty
+    finally:
+        index.flush()
+
+
+def find_indexed_path(workspace_path: str, file_path: str) -> Optional[str]:
+    """
+    按文件 front matter 中的 serial 查找索引中记录的路径
+
+    用于识别跨监控的移动：watchdog 报告为旧路径删除 + 新路径新建时，
+    新文件的 serial 在索引中仍指向旧路径。
+
+    Args:
+        workspace_path: 工作空间目录的绝对路径
+        file_path: Markdown 文件的绝对路径
+
+    Returns:
+        索引中该 serial 对应的文件绝对路径；文件不可读、没有 serial 或 serial 不在索引中时返回 None
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(_FM_HEAD_SIZE)
+    except OSError:
+        return None
+    existing = _get_existing_front_matter(head)
+    if existing is None:
+        return None
+    serial = _extract_serial_from_front_matter(existing[0])
+    if serial is None:
+        return None
+
+    abs_workspace = os.path.abspath(workspace_path)
+    index = _get_index_cache(_get_index_file_path(abs_workspace))
+    # 索引文件可能已被其他进程修改
+    index.refresh()
+    with _INDEX_LOCK:
+        local_path = index.data.get(serial)
+    if local_path is None:
+        return None
+    # 索引中的路径即 _workspace_relative 截取的部分，直接拼回工作空间路径
+    return abs_workspace.rstrip(os.sep) + local_path
+
+
+def _build_checked_context(workspace_path: str, file_path: str) -> _FileContext:
+    """
+    校验工作空间和文件后构建文件处理上下文（供单文件的公共 API 使用）
+
+    Raises:
+        ValueError: 工作空间不存在、文件不在工作空间内或不是 Markdown 文件
+        FileNotFoundError: 文件不存在
+    """
     # 规范化路径
     abs_workspace = os.path.abspath(workspace_path)
     abs_file = os.path.abspath(file_path)
@@ -570,19 +972,19 @@ def index_or_update_file(workspace_path: str, file_path: str) -> bool:
     if not os.path.isfile(abs_file):
         raise FileNotFoundError(f'文件不存在: {abs_file}')
 
-    # 验证文件是否在工作空间内
-    normalized_file = abs_file.rstrip(os.sep)
-    normalized_workspace = abs_workspace.rstrip(os.sep)
-
-    if normalized_file != normalized_workspace and not normalized_file.startswith(normalized_workspace + os.sep):
-        raise ValueError(f'文件不在工作空间内: file={abs_file}, workspace={abs_workspace}')
-
     # 验证是否为 Markdown 文件
     if not abs_file.endswith('.md'):
         raise ValueError(f'文件不是 Markdown 文件: {abs_file}')
 
-    # 调用内部函数处理
-    return _add_front_matter_to_file(abs_file, abs_workspace)
+    # 验证文件是否在工作空间内（构建上下文时一并计算相对路径）
+    try:
+        ctx = _FileContext(abs_workspace, abs_file)
+    except ValueError:
+        raise ValueError(f'文件不在工作空间内: file={abs_file}, workspace={abs_workspace}') from None
+
+    # 索引文件可能已被其他进程修改
+    ctx.index.refresh()
+    return ctx
 
 
 def _remove_assets_dir(workspace_path: str, serial: str) -> bool:
@@ -604,16 +1006,14 @@ def _remove_assets_dir(workspace_path: str, serial: str) -> bool:
     if os.path.isdir(assets_dir):
         try:
             # 优先使用 send2trash 模块
-            try:
-                from send2trash import send2trash
+            if send2trash is not None:
                 send2trash(assets_dir)
                 write_log(f'  已将 assets 目录移动到废纸篓: {assets_dir}')
                 return True
-            except ImportError:
+            else:
                 # send2trash 不可用，使用系统命令
                 if sys.platform == 'darwin':
                     # macOS: 使用 AppleScript
-                    import subprocess
                     escaped_path = assets_dir.replace('\\', '\\\\').replace('"', '\\"')
                     subprocess.run([
                         'osascript', '-e',
@@ -623,13 +1023,11 @@ def _remove_assets_dir(workspace_path: str, serial: str) -> bool:
                     return True
                 elif sys.platform.startswith('linux'):
                     # Linux: 使用 gio trash
-                    import subprocess
                     subprocess.run(['gio', 'trash', assets_dir], check=True, capture_output=True)
                     write_log(f'  已将 assets 目录移动到废纸篓: {assets_dir}')
                     return True
                 else:
                     # 其他平台：直接删除
-                    import shutil
                     shutil.rmtree(assets_dir)
                     write_log(f'  已删除 assets 目录: {assets_dir}')
                     return True
@@ -668,31 +1066,34 @@ def remove_from_index(workspace_path: str, file_path: str) -> bool:
     if not os.path.isdir(abs_workspace):
         raise ValueError(f'工作空间路径不存在: {abs_workspace}')
 
-    index_path = _get_index_file_path(abs_workspace)
-    index_data = _read_index_file(index_path)
-
     # 计算文件的相对路径
     try:
-        relative_path = _calculate_file_relative_path(abs_workspace, abs_file)
+        ctx = _FileContext(abs_workspace, abs_file)
     except ValueError:
         # 文件不在工作空间内，无法移除
         return False
+    index = ctx.index
+    relative_path = ctx.rel_for_index
+
+    # 索引文件可能已被其他进程修改
+    index.refresh()
+
+    with _INDEX_LOCK:
+        index_data = index.data
 
-    # 查找并移除该文件的索引
-    removed = False
-    to_delete = []
+        # 通过反向索引直接定位该路径对应的 serial
+        serials = index.reverse.pop(relative_path, [])
+        removed = bool(serials)
 
-    for serial, path in index_data.items():
-        if path == relative_path:
-            to_delete.append(serial)
-            removed = True
+        # 仅从索引中移除（不再删除 assets 目录）
+        for serial in serials:
+            index_data.pop(serial, None)
 
-    # 仅从索引中移除（不再删除 assets 目录）
-    for serial in to_delete:
-        del index_data[serial]
+        if removed:
+            index.mark_dirty()
 
     if removed:
-        _write_index_file(index_path, index_data)
+        index.flush()
 
     return removed
 
@@ -700,7 +1101,9 @@ def remove_from_index(workspace_path: str, file_path: str) -> bool:
 # 定义公共 API（__all__ 用于控制 from module import * 的行为）
 __all__ = [
     'index_or_update_file',
+    'index_rename',
     'remove_from_index',
+    'find_indexed_path',
     'TYPORA_WORKSPACE_ENV',
 ]
 
@@ -16,25 +16,33 @@
 """
 
 import argparse
+import errno
 import os
 import re
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 
 from util.logger import write_log
 
 # 环境变量名称
 TYPORA_WORKSPACE_ENV = 'TYPORA_WORKSPACE'
 
+# front matter 整体匹配：--- 包围的部分
+_FM_RE = re.compile(r'^---\s*\n(.*?)\n---', re.DOTALL)
+# front matter 字段匹配：每行 key: value（模块加载时编译一次，findall 一次取出全部字段）
+_FM_LINE = re.compile(r'^[ \t]*([a-zA-Z0-9_-]+):[ \t]*(.*?)[ \t\r]*$', re.MULTILINE)
 
-def parse_front_matter(markdown_file: Path) -> dict:
+
+def parse_front_matter(markdown_file: Path, log: Callable[[str], None] = write_log) -> dict:
     """
     解析markdown文件的front matter，返回包含typora-root-url等字段的字典
 
     Args:
         markdown_file: markdown文件路径
+        log: 日志输出函数
 
     Returns:
         包含front matter字段的字典
@@ -46,20 +54,13 @@ def parse_front_matter(markdown_file: Path) -> dict:
             content = f.read()
 
         # 匹配 --- 包围的front matter
-        pattern = r'^---\s*\n(.*?)\n---'
-        match = re.match(pattern, content, re.DOTALL)
+        match = _FM_RE.match(content)
 
         if match:
-            fm_content = match.group(1)
-            for line in fm_content.split('\n'):
-                # 匹配 key: value 格式
-                kv_match = re.match(r'^\s*([a-zA-Z0-9_-]+):\s*(.*?)\s*$', line)
-                if kv_match:
-                    key = kv_match.group(1)
-                    value = kv_match.group(2)
-                    front_matter[key] = value
+            # 匹配 key: value 格式
+            front_matter = dict(_FM_LINE.findall(match.group(1)))
     except Exception as e:
-        write_log(f"解析front matter失败: {markdown_file}, 错误: {e}")
+        log(f"解析front matter失败: {markdown_file}, 错误: {e}")
 
     return front_matter
 
@@ -85,17 +86,20 @@ def get_asset_images(asset_dir: Path) -> list[Path]:
     return images
 
 
-def update_markdown_image_links(markdown_file: Path, file_stem: str, serial: str, dry_run: bool = False) -> int:
+def update_markdown_image_links(markdown_file: Path, file_stem: str, serial: str, dry_run: bool = False,
+                                log: Callable[[str], None] = write_log) -> int:
     """
     更新markdown文件中的图片链接，将.assets/文件名/替换为/.assets/{serial首位}/{serial}/
 
-    使用简单的字符串替换，避免正则表达式的转义问题
+    .assets/文件名/ 和 ./.assets/文件名/ 两种写法用一个正则一次扫描完成（subn 同时返回替换次数），
+    只匹配当前文件名的目录；正文不含 .assets/ 时直接返回，不做任何扫描
 
     Args:
         markdown_file: markdown文件路径
         file_stem: markdown文件名(不含扩展名)
         serial: 文章的 serial
         dry_run: 是否仅模拟运行
+        log: 日志输出函数
 
     Returns:
         替换的链接数量
@@ -104,52 +108,90 @@ def update_markdown_image_links(markdown_file: Path, file_stem: str, serial: str
         with open(markdown_file, 'r', encoding='utf-8') as f:
             content = f.read()
     except Exception as e:
-        write_log(f"  读取文件失败: {e}")
+        log(f"  读取文件失败: {e}")
+        return 0
+
+    # 不含任何 .assets/ 引用时无需替换
+    if '.assets/' not in content:
         return 0
 
     # 构建新的图片路径: /.assets/{serial首位}/{serial}/
     new_path = f'/.assets/{serial[:1]}/{serial}/'
 
-    # 需要替换的旧路径
-    old_path_1 = f'.assets/{file_stem}/'
-    old_path_2 = f'./.assets/{file_stem}/'
-
-    # 统计替换次数
-    count_1 = content.count(old_path_1)
-    count_2 = content.count(old_path_2)
-
-    # 执行替换
-    content = content.replace(old_path_1, new_path)
-    content = content.replace(old_path_2, new_path)
-
-    replaced_count = count_1 + count_2
+    # 需要替换的旧路径: .assets/文件名/ 或 ./.assets/文件名/，一次扫描同时完成计数和替换
+    old_path_re = re.compile(r'(?:\./)?\.assets/' + re.escape(file_stem) + '/')
+    # 替换内容按字面处理（函数形式避免 new_path 中的反斜杠被当作转义）
+    content, replaced_count = old_path_re.subn(lambda _: new_path, content)
 
     if replaced_count > 0:
         if not dry_run:
             try:
                 with open(markdown_file, 'w', encoding='utf-8') as f:
                     f.write(content)
-                write_log(f"  更新链接: {replaced_count} 个")
+                log(f"  更新链接: {replaced_count} 个")
             except Exception as e:
-                write_log(f"  写入文件失败: {e}")
+                log(f"  写入文件失败: {e}")
                 return 0
         else:
-            write_log(f"  [模拟] 更新链接: {replaced_count} 个")
+            log(f"  [模拟] 更新链接: {replaced_count} 个")
     else:
         # 检查是否有类似的路径但未被替换
         if '.assets/' in content and file_stem in content:
-            write_log(f"  警告: 文件中包含.assets和{file_stem}，但未找到匹配的图片路径")
+            log(f"  警告: 文件中包含.assets和{file_stem}，但未找到匹配的图片路径")
 
     return replaced_count
 
 
-def move_images_to_root_url(markdown_file: Path, dry_run: bool = False) -> int:
+def _reserve_target_path(target_dir: Path, name: str) -> Path:
+    """
+    在目标目录中原子地占用一个不冲突的文件名
+
+    用 O_CREAT | O_EXCL 创建空的占位文件，文件名已存在时依次尝试 名称_1、名称_2 ...，
+    避免先判断 exists 再移动之间被其他线程抢占同名文件。
+
+    Args:
+        target_dir: 目标目录
+        name: 期望的文件名
+
+    Returns:
+        已占用的目标文件路径（空的占位文件，随后由移动操作覆盖）
+    """
+    target_path = target_dir / name
+    base, ext = target_path.stem, target_path.suffix
+    counter = 1
+    while True:
+        try:
+            fd = os.open(target_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            target_path = target_dir / f"{base}_{counter}{ext}"
+            counter += 1
+            continue
+        os.close(fd)
+        return target_path
+
+
+def _move_file(src: Path, dst: Path) -> None:
+    """
+    移动文件并覆盖目标：同一文件系统内直接 os.replace（一次系统调用），
+    跨文件系统（EXDEV）时回退到 shutil.move 的复制再删除
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(src), str(dst))
+
+
+def move_images_to_root_url(markdown_file: Path, dry_run: bool = False,
+                            log: Callable[[str], None] = write_log) -> int:
     """
     将markdown文件assets目录中的图片移动到typora-copy-images-to指定的目录
 
     Args:
         markdown_file: markdown文件路径
         dry_run: 是否仅模拟运行，不实际移动文件
+        log: 日志输出函数，批量并发处理时传入收集函数，由调用方按文件整体输出
 
     Returns:
         成功移动的图片数量
@@ -158,16 +200,16 @@ def move_images_to_root_url(markdown_file: Path, dry_run: bool = False) -> int:
     file_stem = markdown_file.stem
 
     # 解析front matter获取typora-copy-images-to和serial
-    front_matter = parse_front_matter(markdown_file)
+    front_matter = parse_front_matter(markdown_file, log)
     copy_images_to = front_matter.get('typora-watch-dog-copy-images-to')
     serial = front_matter.get('serial')
 
     if not copy_images_to:
-        write_log(f"跳过 (无typora-copy-images-to): {markdown_file}")
+        log(f"跳过 (无typora-copy-images-to): {markdown_file}")
         return 0
 
     if not serial:
-        write_log(f"跳过 (无serial): {markdown_file}")
+        log(f"跳过 (无serial): {markdown_file}")
         return 0
 
     # 构建源目录路径: ./.assets/文件名/
@@ -177,7 +219,7 @@ def move_images_to_root_url(markdown_file: Path, dry_run: bool = False) -> int:
     images = get_asset_images(asset_dir)
 
     if not images:
-        write_log(f"跳过 (无图片): {markdown_file}")
+        log(f"跳过 (无图片): {markdown_file}")
         return 0
 
     # 构建目标目录 (基于markdown文件的相对路径)
@@ -188,69 +230,110 @@ def move_images_to_root_url(markdown_file: Path, dry_run: bool = False) -> int:
     if not dry_run:
         target_dir.mkdir(parents=True, exist_ok=True)
     else:
-        write_log(f"  [模拟] 创建目录: {target_dir}")
+        log(f"  [模拟] 创建目录: {target_dir}")
 
     moved_count = 0
 
     # 移动图片
     for img in images:
-        target_path = target_dir / img.name
-
-        # 如果目标文件已存在，添加后缀
-        if target_path.exists():
-            base = target_path.stem
-            ext = target_path.suffix
-            counter = 1
-            while target_path.exists():
-                target_path = target_dir / f"{base}_{counter}{ext}"
-                counter += 1
-
         if dry_run:
-            write_log(f"  [模拟] 移动: {img} -> {target_path}")
+            target_path = target_dir / img.name
+
+            # 如果目标文件已存在，添加后缀
+            if target_path.exists():
+                base = target_path.stem
+                ext = target_path.suffix
+                counter = 1
+                while target_path.exists():
+                    target_path = target_dir / f"{base}_{counter}{ext}"
+                    counter += 1
+
+            log(f"  [模拟] 移动: {img} -> {target_path}")
         else:
+            target_path = None
             try:
-                shutil.move(str(img), str(target_path))
-                write_log(f"  移动: {img.name} -> {target_path}")
+                # 先占用目标文件名（已存在时自动添加后缀），再覆盖占位文件
+                target_path = _reserve_target_path(target_dir, img.name)
+                _move_file(img, target_path)
+                log(f"  移动: {img.name} -> {target_path}")
                 moved_count += 1
             except Exception as e:
-                write_log(f"  移动失败: {img}, 错误: {e}")
+                log(f"  移动失败: {img}, 错误: {e}")
+                # 移动失败时清理占位文件
+                if target_path is not None and img.exists():
+                    try:
+                        os.unlink(target_path)
+                    except OSError:
+                        pass
+
+    # 更新markdown文件中的图片链接（先于清理目录，清理失败也不会留下失效链接）
+    if moved_count > 0:
+        update_markdown_image_links(markdown_file, file_stem, serial, dry_run=dry_run, log=log)
 
     # 检查并清理空的assets目录
     if not dry_run:
-        asset_parent = asset_dir.parent
-        if asset_dir.exists() and not list(asset_dir.iterdir()):
-            asset_dir.rmdir()
-            write_log(f"  清理空目录: {asset_dir}")
+        _remove_dir_if_empty(asset_dir, log)
+        # 同一目录下的笔记并发处理时共用 .assets 父目录，只有最后一个清空它的线程能删除成功
+        _remove_dir_if_empty(asset_dir.parent, log)
 
-        if asset_parent.exists() and not list(asset_parent.iterdir()):
-            asset_parent.rmdir()
-            write_log(f"  清理空目录: {asset_parent}")
+    return moved_count
 
-    # 更新markdown文件中的图片链接
-    if moved_count > 0:
-        update_markdown_image_links(markdown_file, file_stem, serial, dry_run=dry_run)
 
-    return moved_count
+def _remove_dir_if_empty(directory: Path, log: Callable[[str], None] = write_log) -> None:
+    """
+    删除空目录；目录不存在（已被其他线程删除）或不为空时静默跳过
+
+    直接尝试 rmdir 而不是先检查再删除，避免并发处理时检查与删除之间的竞争
+    """
+    try:
+        directory.rmdir()
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+            return
+        log(f"  清理目录失败: {directory}, 错误: {e}")
+        return
+    log(f"  清理空目录: {directory}")
 
 
-def walk_markdown_files(root_dir: Path) -> list[Path]:
+# markdown 文件扩展名（小写，供 str.endswith 一次判断）
+MARKDOWN_EXTENSIONS = ('.md', '.markdown', '.mdown', '.mkd')
+
+
+def walk_markdown_files(root_dir: Path) -> Iterator[Path]:
     """
-    遍历目录，返回所有markdown文件
+    遍历目录，逐个返回所有markdown文件
+
+    使用 os.walk 只按文件名后缀过滤，不为非 markdown 文件创建 Path 对象；
+    .assets 目录只存放图片，整棵子树直接跳过。
 
     Args:
         root_dir: 根目录
 
     Returns:
-        markdown文件路径列表
+        markdown文件路径生成器（不排序）
     """
-    markdown_extensions = {'.md', '.markdown', '.mdown', '.mkd'}
-    markdown_files = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        # 原地修改 dirnames，os.walk 不会再进入被移除的目录
+        dirnames[:] = [d for d in dirnames if d != '.assets']
+        for filename in filenames:
+            if filename.lower().endswith(MARKDOWN_EXTENSIONS):
+                yield Path(dirpath, filename)
 
-    for file in root_dir.rglob('*'):
-        if file.is_file() and file.suffix.lower() in markdown_extensions:
-            markdown_files.append(file)
 
-    return sorted(markdown_files)
+def _move_images_logged(markdown_file: Path, dry_run: bool) -> int:
+    """
+    批量处理中的单个文件：移动图片并更新链接
+
+    多个文件并发处理，每个文件的日志先收集起来，处理结束（包括出错）时以文件路径开头作为一条日志输出，
+    同一文件的日志不会和其他文件的日志穿插在一起。
+    """
+    lines = [f"处理: {markdown_file}"]
+    try:
+        return move_images_to_root_url(markdown_file, dry_run, log=lines.append)
+    finally:
+        write_log('\n'.join(lines))
 
 
 def main():
@@ -317,18 +400,29 @@ def main():
     write_log("-" * 60)
 
     # 遍历所有markdown文件
-    markdown_files = walk_markdown_files(workspace_root)
+    markdown_files = list(walk_markdown_files(workspace_root))
     write_log(f"找到 {len(markdown_files)} 个markdown文件")
     write_log("")
 
     total_moved = 0
     processed = 0
 
-    for md_file in markdown_files:
-        moved = move_images_to_root_url(md_file, dry_run=args.dry_run)
-        if moved > 0:
-            total_moved += moved
-            processed += 1
+    # 每个文件的图片目录互不相关，处理以文件 I/O 为主，使用线程池并发处理
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_move_images_logged, md_file, args.dry_run): md_file
+            for md_file in markdown_files
+        }
+        for future in as_completed(futures):
+            try:
+                moved = future.result()
+            except Exception as e:
+                write_log(f"处理失败: {futures[future]}, 错误: {e}")
+                continue
+            if moved > 0:
+                total_moved += moved
+                processed += 1
 
     write_log("-" * 60)
     write_log("")
@@ -1,15 +1,29 @@
 import os
+from collections import deque
+
+
+def iter_files_by_extension(directory, extension, skip_dir_names=frozenset(), skip_hidden_dirs=False):
+    # 以生成器方式逐个返回匹配的文件路径，调用方可以边遍历边消费，无需先拼出完整列表
+    # 使用显式队列按层遍历目录，避免每层子目录一次函数调用，目录层级很深时也不会触发 RecursionError
+    # 名称在 skip_dir_names 中的目录（以及 skip_hidden_dirs 时以 . 开头的目录）整棵子树跳过
+    suffix = '.' + extension
+    pending = deque([directory])
+    while pending:
+        current = pending.popleft()
+        # with 保证每个目录的 scandir 迭代器及时关闭，同一时刻只打开一个目录句柄
+        with os.scandir(current) as it:
+            for entry in it:
+                name = entry.name
+                # 先按文件名过滤，名称不匹配的文件无需判断类型
+                # DirEntry 自带类型缓存，follow_symlinks=False 时无需额外 stat，也不会跟随目录软链接造成循环
+                if name.endswith(suffix) and entry.is_file(follow_symlinks=False):
+                    yield entry.path
+                # 跳过的目录按名称判断，无需判断类型；其余目录入队稍后处理
+                elif name not in skip_dir_names and not (skip_hidden_dirs and name.startswith('.')) \
+                        and entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
 
 
 def find_files_by_extension(directory, extension):
-    file_list = []
-    # 遍历目录
-    for entry in os.scandir(directory):
-        # 如果是文件且扩展名匹配
-        if entry.is_file() and entry.name.endswith(f'.{extension}'):
-            file_list.append(entry.path)
-        # 如果是目录，递归查找
-        elif entry.is_dir():
-            file_list.extend(find_files_by_extension(entry.path, extension))
-
-    return file_list
\ No newline at end of file
+    # 保持返回列表的接口不变，只在最外层收集一次
+    return list(iter_files_by_extension(directory, extension))
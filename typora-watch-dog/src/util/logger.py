@@ -1,9 +1,19 @@
-from datetime import datetime
+import atexit
+import sys
+import threading
+import time
 
 # log_strategy = 'file'
 log_strategy = 'console'
 # log_strategy = 'disable'
 
+# 文件日志路径
+LOG_FILE_PATH = '/Users/laomst/__code_workspace__/__Laomst/laomst-typora-watch-dog-ext/log.txt'
+
+# 文件日志句柄：首次写入时打开，之后所有调用复用，进程退出时关闭（关闭时写出缓冲区）
+_log_fh = None
+_log_fh_lock = threading.Lock()
+
 def write_log(msg):
     if log_strategy == 'file':
         _write_file_log(msg)
@@ -14,28 +24,36 @@ def reset_log():
     if log_strategy == 'file':
         _reset_file_log()
 
+def _get_log_fh():
+    global _log_fh
+    if _log_fh is None:
+        with _log_fh_lock:
+            if _log_fh is None:
+                # 带缓冲的追加模式，避免每条日志都 open/close 一次
+                _log_fh = open(LOG_FILE_PATH, 'a', buffering=8192, encoding='utf-8')
+    return _log_fh
+
+def _close_log_fh():
+    global _log_fh
+    with _log_fh_lock:
+        if _log_fh is not None:
+            _log_fh.close()
+            _log_fh = None
+
+atexit.register(_close_log_fh)
+
 def _write_file_log(msg):
-    # 打开文件，指定写入模式 'w'
-    with open('/Users/laomst/__code_workspace__/__Laomst/laomst-typora-watch-dog-ext/log.txt', 'a') as file:
-        # 写入多行内容
-        # 获取当前时间
-        current_time = datetime.now()
-
-        # 格式化为字符串
-        formatted_time = current_time.strftime("%Y/%m/%d %H:%M:%S")
-        file.write('\n' + formatted_time + '\n')
-        file.writelines([msg])
+    # time.strftime 直接格式化当前本地时间，无需构造 datetime 对象
+    formatted_time = time.strftime("%Y/%m/%d %H:%M:%S")
+    _get_log_fh().write('\n' + formatted_time + '\n' + msg)
 
 def _write_console_log(msg):
-    print(msg)
+    # 消息和换行一次写出（print 会分两次写入），多线程同时输出时换行不会错位
+    sys.stdout.write(msg + '\n')
 
 def _reset_file_log():
-    # 打开文件，指定写入模式 'w'
-    with open('/Users/laomst/__code_workspace__/__Laomst/laomst-typora-watch-dog-ext/log.txt', 'w') as file:
-        # 写入多行内容
-        # 获取当前时间
-        current_time = datetime.now()
-
-        # 格式化为字符串
-        formatted_time = current_time.strftime("%Y/%m/%d %H:%M:%S")
+    # 先关闭复用的句柄（写出缓冲区），再以写入模式 'w' 清空文件
+    _close_log_fh()
+    with open(LOG_FILE_PATH, 'w', encoding='utf-8') as file:
+        formatted_time = time.strftime("%Y/%m/%d %H:%M:%S")
         file.write('\n' + formatted_time + '\n')
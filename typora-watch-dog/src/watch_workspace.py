@@ -14,6 +14,7 @@ Typora 工作空间文件监控服务
 - 同一文件的同一事件在 10 秒内仅触发一次
 - 防止短时间内重复处理（如编辑器保存时的多次事件）
 - 支持的事件类型：created、moved、deleted、modified
+- watchdog 事件先进入合并队列，同一文件在 0.2 秒内的连续事件合并为一次后由后台线程处理
 
 依赖管理：
 - 启动时自动检查并安装必要的依赖（watchdog）
@@ -24,6 +25,7 @@ Typora 工作空间文件监控服务
 - 日志文件格式：typora-watch-dog-watch.log（当前）、typora-watch-dog-watch.YYYY-MM-DD.log（历史）
 - 自动清理超过保留天数的旧日志文件
 - 默认保留 30 天的日志（可通过 --log-retention 参数调整）
+- 文件日志经 QueueHandler 入队，由后台 QueueListener 线程写盘，事件处理线程不会被磁盘 I/O 阻塞
 
 使用方式：
     # 手动运行（前台）
@@ -56,11 +58,17 @@ import argparse
 import atexit
 import logging
 import os
+import queue
+import re
+import select
+import signal
+import subprocess
 import sys
+import threading
 import time
-from collections import defaultdict
-from logging.handlers import TimedRotatingFileHandler
-from pathlib import Path
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from typing import Dict, Optional, Tuple
 
 # 环境变量名称
@@ -69,19 +77,52 @@ TYPORA_WORKSPACE_ENV = 'TYPORA_WORKSPACE'
 # PID 文件路径（用于后台运行管理）
 PID_FILE = os.path.expanduser('~/.typora-ext-watch.pid')
 
+# 停止服务时等待进程退出的最长时间（秒）
+STOP_TIMEOUT = 5
+
+# 持有 PID 文件锁的文件描述符（write_pid_file 成功后保持打开直到进程退出）
+_pid_file_fd: Optional[int] = None
+
 # 系统服务环境变量（由服务安装脚本设置）
 SYSTEM_SERVICE_ENV = 'TYPORA_WATCH_SERVICE'
 
+# logger 名称
+LOGGER_NAME = 'typora-watch-dog-watch'
+
 # 日志目录
 LOG_DIR = os.path.expanduser('~/.typora-ext-logs')
 # 日志文件保留天数（默认 30 天）
 DEFAULT_LOG_RETENTION_DAYS = 30
 
+# 日志文件写缓冲区大小（字节）
+LOG_BUFFER_SIZE = 64 * 1024
+# 日志文件定时写出缓冲区的间隔（秒），ERROR 及以上级别的日志立即写出
+LOG_FLUSH_INTERVAL = 30
+
+# 日志文件名前缀、当前日志文件名
+_LOG_NAME_PREFIX = 'typora-watch-dog-watch'
+_CURRENT_LOG_NAME = _LOG_NAME_PREFIX + '.log'
+# 当前日志文件的完整路径（固定不变，轮转时由 TimedRotatingFileHandler 重命名为带日期的历史文件）
+LOG_FILE = os.path.join(LOG_DIR, _CURRENT_LOG_NAME)
+# 历史日志文件名，分组依次为年、月、日：
+# - 新格式：typora-watch-dog-watch.YYYY-MM-DD.log
+# - 旧格式：typora-watch-dog-watch-YYYY-MM-DD.log、typora-watch-dog-watch-error-YYYY-MM-DD.log
+_LOG_NAME_RE = re.compile(r'typora-watch-dog-watch(?:\.|-(?:error-)?)(\d{4})-(\d{2})-(\d{2})\.log')
+
+# 文件日志的后台写盘线程（setup_logger 首次启用文件日志时创建）
+_log_listener: Optional[QueueListener] = None
+
+# watchdog 事件处理器适配器类（create_watchdog_handler 首次调用时定义）
+_watchdog_handler_class = None
+
 # 导入索引模块
 try:
     from index_typora_markdowns import (
         index_or_update_file,
+        index_rename,
         remove_from_index,
+        find_indexed_path,
+        SKIP_DIR_NAMES,
         TYPORA_WORKSPACE_ENV,
     )
 except ImportError:
@@ -89,17 +130,50 @@ except ImportError:
     sys.path.insert(0, os.path.dirname(__file__))
     from index_typora_markdowns import (
         index_or_update_file,
+        index_rename,
         remove_from_index,
+        find_indexed_path,
+        SKIP_DIR_NAMES,
         TYPORA_WORKSPACE_ENV,
     )
 
-# 导入 watchdog（如果不可用会在 main 时报错）
+# fcntl 仅在类 Unix 系统上可用，用于给 PID 文件加锁
 try:
-    from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler
+    import fcntl
 except ImportError:
-    Observer = None
-    FileSystemEventHandler = None
+    fcntl = None
+
+Observer = None
+PatternMatchingEventHandler = None
+generate_sub_created_events = None
+generate_sub_moved_events = None
+
+
+def _import_watchdog() -> bool:
+    """
+    导入 watchdog 并绑定到模块级名称（如果不可用会在 main 时报错）
+
+    模块导入时调用一次；check_and_install_dependencies 自动安装 watchdog 后再调用一次，
+    使后续代码统一使用模块级名称，无需在函数内部再局部导入。
+
+    Returns:
+        是否导入成功
+    """
+    global Observer, PatternMatchingEventHandler, generate_sub_created_events, generate_sub_moved_events
+
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import (
+            PatternMatchingEventHandler,
+            generate_sub_created_events,
+            generate_sub_moved_events,
+        )
+    except ImportError:
+        return False
+    return True
+
+
+_import_watchdog()
 
 
 def check_and_install_dependencies() -> None:
@@ -108,8 +182,6 @@ def check_and_install_dependencies() -> None:
 
     检查 watchdog 是否安装，如果没有则自动安装
     """
-    import subprocess
-
     dependencies = {
         'watchdog': 'watchdog',
     }
@@ -118,31 +190,99 @@ def check_and_install_dependencies() -> None:
         try:
             __import__(module_name)
         except ImportError:
-            get_logger().warning(f'未安装 {module_name} 模块，正在自动安装...')
+            LOGGER.warning(f'未安装 {module_name} 模块，正在自动安装...')
             try:
                 subprocess.check_call(
                     [sys.executable, '-m', 'pip', 'install', '--break-system-packages', package_name],
                     stdout=subprocess.DEVNULL,
                     stderr=subprocess.DEVNULL
                 )
-                get_logger().info(f'✓ {module_name} 安装成功')
+                LOGGER.info(f'✓ {module_name} 安装成功')
                 # 重新导入验证
                 __import__(module_name)
+                if module_name == 'watchdog':
+                    _import_watchdog()
             except subprocess.CalledProcessError:
-                get_logger().error(f'✗ {module_name} 安装失败')
-                get_logger().error(f'请手动运行: pip install {package_name}')
+                LOGGER.error(f'✗ {module_name} 安装失败')
+                LOGGER.error(f'请手动运行: pip install {package_name}')
                 sys.exit(1)
             except Exception as e:
-                get_logger().error(f'✗ {module_name} 安装失败: {e}')
+                LOGGER.error(f'✗ {module_name} 安装失败: {e}')
                 sys.exit(1)
 
 
+class BufferedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """
+    带写缓冲的按日轮转文件 handler
+
+    标准 StreamHandler 每写一条日志都会 flush 一次，批量移动文件等产生大量事件时，
+    每条日志都是一次 write 系统调用。这里以 LOG_BUFFER_SIZE 大小的缓冲区打开日志文件，
+    只在以下时机写出缓冲区：
+    - 记录的级别 >= ERROR（错误日志不能因进程崩溃而丢失）
+    - 后台线程每隔 flush_interval 秒定时写出
+    - 轮转或关闭 handler 时（关闭文件会写出缓冲区，进程退出时由 logging.shutdown 触发）
+    """
+
+    def __init__(self, *args, flush_interval: float = LOG_FLUSH_INTERVAL, **kwargs):
+        """
+        Args:
+            flush_interval: 定时写出缓冲区的间隔（秒）
+            其余参数同 TimedRotatingFileHandler
+        """
+        super().__init__(*args, **kwargs)
+        self.flush_interval = flush_interval
+        self._stop_flusher = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically,
+            name='log-flusher',
+            daemon=True
+        )
+        self._flusher.start()
+
+    def _open(self):
+        """以较大的写缓冲区打开日志文件（轮转后重新打开时同样生效）"""
+        return open(self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE,
+                    encoding=self.encoding, errors=self.errors)
+
+    def flush(self):
+        """StreamHandler.emit 每条记录后都会调用，这里不写出缓冲区，见 force_flush"""
+
+    def force_flush(self):
+        """立即将缓冲区写入文件"""
+        self.acquire()
+        try:
+            if self.stream and hasattr(self.stream, 'flush'):
+                self.stream.flush()
+        finally:
+            self.release()
+
+    def emit(self, record):
+        super().emit(record)
+        if record.levelno >= logging.ERROR:
+            self.force_flush()
+
+    def close(self):
+        self._stop_flusher.set()
+        super().close()
+
+    def _flush_periodically(self):
+        """后台线程：每隔 flush_interval 秒写出一次缓冲区，直到 handler 关闭"""
+        while not self._stop_flusher.wait(self.flush_interval):
+            self.force_flush()
+
+
 def setup_logger(log_to_file: bool = True, log_retention_days: int = DEFAULT_LOG_RETENTION_DAYS) -> logging.Logger:
     """
     设置日志系统（幂等性：多次调用不会重复添加 handler）
 
-    使用 TimedRotatingFileHandler 实现每天午夜自动轮转日志文件，
-    保留指定天数的日志文件。
+    使用 BufferedTimedRotatingFileHandler 实现每天午夜自动轮转日志文件，
+    保留指定天数的日志文件，写文件带缓冲，不再每条日志写一次磁盘。
+
+    文件日志不直接挂在 logger 上：logger 只挂 QueueHandler 把日志记录放入内存队列，
+    由 QueueListener 的后台线程取出后写入 BufferedTimedRotatingFileHandler。
+    控制台 handler 在首次调用时添加，文件日志在首次以 log_to_file=True 调用时启用（已有控制台
+    handler 时也会补上文件日志），因此 main 中先只启用控制台输出，fork 之后再按命令行参数启用
+    文件日志，保证后台线程在守护进程中启动。
 
     Args:
         log_to_file: 是否写入日志文件
@@ -151,40 +291,40 @@ def setup_logger(log_to_file: bool = True, log_retention_days: int = DEFAULT_LOG
     Returns:
         logger 实例
     """
-    logger = logging.getLogger('typora-watch-dog-watch')
+    global _log_listener
 
-    # 如果已经有 handler，说明已经初始化过了，直接返回
-    if logger.handlers:
-        return logger
-
-    logger.setLevel(logging.INFO)
+    logger = logging.getLogger(LOGGER_NAME)
 
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
-    # 控制台输出
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    # 控制台输出（如果已经有 handler，说明已经初始化过了）
+    if not logger.handlers:
+        logger.setLevel(logging.INFO)
+        # 日志只由这里配置的 handler 输出，不再向上传递给 root logger 的 handler
+        logger.propagate = False
+
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
+        logger.addHandler(console_handler)
 
-    # 文件输出（使用 TimedRotatingFileHandler 实现每日轮转）
-    if log_to_file:
+    # 文件输出（使用 TimedRotatingFileHandler 实现每日轮转），已启用过则不再重复添加
+    if log_to_file and _log_listener is None:
         # 确保日志目录存在
         os.makedirs(LOG_DIR, exist_ok=True)
 
-        # 使用固定基础文件名，TimedRotatingFileHandler 会自动添加日期后缀
-        # 例如：typora-watch-dog-watch.log、typora-watch-dog-watch.log.2024-01-01、typora-watch-dog-watch.log.2024-01-02
-        base_log_file = os.path.join(LOG_DIR, 'typora-watch-dog-watch.log')
+        # 使用固定基础文件名，TimedRotatingFileHandler 轮转时会添加日期后缀（经 namer 调整格式）
+        # 例如：typora-watch-dog-watch.log、typora-watch-dog-watch.2024-01-01.log、typora-watch-dog-watch.2024-01-02.log
 
-        # 创建 TimedRotatingFileHandler
+        # 创建 BufferedTimedRotatingFileHandler
         # - when='midnight': 每天午夜轮转
         # - interval=1: 每 1 天轮转一次
         # - backupCount: 保留的日志文件数量（设置为保留天数 + 1，因为包括当前文件）
-        file_handler = TimedRotatingFileHandler(
-            filename=base_log_file,
+        file_handler = BufferedTimedRotatingFileHandler(
+            filename=LOG_FILE,
             when='midnight',
             interval=1,
             backupCount=log_retention_days + 1,
@@ -199,18 +339,37 @@ def setup_logger(log_to_file: bool = True, log_retention_days: int = DEFAULT_LOG
         # 设置轮转时的回调函数，用于清理旧日志
         # 注意：TimedRotatingFileHandler 会自动删除超过 backupCount 的文件
 
-        logger.addHandler(file_handler)
+        # 日志调用只把记录放入队列（不设上限，避免突发大量事件时丢日志），
+        # 由后台线程写入文件；respect_handler_level 使 file_handler 的级别仍然生效
+        log_queue = queue.Queue()
+        logger.addHandler(QueueHandler(log_queue))
+        _log_listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _log_listener.start()
+        # 退出时停止后台线程，队列中剩余的日志会先全部写入文件
+        atexit.register(stop_log_listener)
 
     return logger
 
 
+def stop_log_listener() -> None:
+    """停止文件日志的后台写盘线程，队列中剩余的日志会先全部写入文件（可重复调用）"""
+    global _log_listener
+
+    listener, _log_listener = _log_listener, None
+    if listener is not None:
+        listener.stop()
+
+
 def clean_old_logs(retention_days: int = DEFAULT_LOG_RETENTION_DAYS) -> dict:
     """
     清理超过保留天数的旧日志文件
 
     支持两种日志文件名格式：
     - 旧格式：typora-watch-dog-watch-YYYY-MM-DD.log、typora-watch-dog-watch-error-YYYY-MM-DD.log
-    - 新格式：typora-watch-dog-watch.log.YYYY-MM-DD（TimedRotatingFileHandler 生成）
+    - 新格式：typora-watch-dog-watch.YYYY-MM-DD.log（TimedRotatingFileHandler 轮转后经 namer 重命名）
+
+    两种格式都由预编译的 _LOG_NAME_RE 一次匹配并提取年、月、日。
+    使用 os.scandir 遍历，文件大小取自 DirEntry.stat()，无需再为每个文件拼路径调用 getsize。
 
     Args:
         retention_days: 日志保留天数
@@ -218,66 +377,115 @@ def clean_old_logs(retention_days: int = DEFAULT_LOG_RETENTION_DAYS) -> dict:
     Returns:
         清理统计：{'deleted': 数量, 'freed_bytes': 字节数}
     """
-    from datetime import datetime, timedelta
-    import re
-
     stats = {'deleted': 0, 'freed_bytes': 0}
 
     if not os.path.exists(LOG_DIR):
         return stats
 
-    # 计算截止日期
-    cutoff_date = datetime.now() - timedelta(days=retention_days)
-    cutoff_str = cutoff_date.strftime('%Y-%m-%d')
+    # 计算截止日期，以 (年, 月, 日) 元组比较，无需为每个文件构造 datetime
+    cutoff_date = (datetime.now() - timedelta(days=retention_days)).date()
+    cutoff_key = (cutoff_date.year, cutoff_date.month, cutoff_date.day)
 
-    # 匹配日期的正则表达式（YYYY-MM-DD 格式）
-    date_pattern = re.compile(r'(\d{4}-\d{2}-\d{2})')
+    with os.scandir(LOG_DIR) as it:
+        for entry in it:
+            filename = entry.name
+            # 只处理带日期的历史日志文件（当前日志文件不匹配）
+            match = _LOG_NAME_RE.fullmatch(filename)
+            if not match or not entry.is_file(follow_symlinks=False):
+                continue
 
-    for filename in os.listdir(LOG_DIR):
-        # 只处理 typora-watch-dog-watch 相关的日志文件
-        if not filename.startswith('typora-watch-dog-watch') or not filename.endswith('.log'):
-            continue
+            file_key = tuple(map(int, match.groups()))
 
-        # 跳过当前日志文件（没有日期后缀的）
-        if filename == 'typora-watch-dog-watch.log':
-            continue
-
-        # 从文件名中提取日期
-        match = date_pattern.search(filename)
-        if not match:
-            continue
-
-        file_date_str = match.group(1)
-        try:
-            file_date = datetime.strptime(file_date_str, '%Y-%m-%d')
-            if file_date < cutoff_date:
-                file_path = os.path.join(LOG_DIR, filename)
-                file_size = os.path.getsize(file_path)
-                os.remove(file_path)
+            # 日志日期不晚于截止日期（即当天零点早于截止时间）的文件视为过期
+            if file_key <= cutoff_key:
+                # 单个文件删除失败（权限不足、已被其他进程删除等）只记录，不影响其余文件
+                try:
+                    file_size = entry.stat().st_size
+                    os.remove(entry.path)
+                except OSError as e:
+                    LOGGER.warning(f'删除旧日志失败: {filename}, 错误: {e}')
+                    continue
                 stats['deleted'] += 1
                 stats['freed_bytes'] += file_size
-                get_logger().info(f'已删除旧日志: {filename}')
-        except ValueError:
-            # 文件名格式不正确，跳过
-            pass
+                LOGGER.info(f'已删除旧日志: {filename}')
 
     if stats['deleted'] > 0:
-        get_logger().info(f'日志清理完成: 删除 {stats["deleted"]} 个文件, 释放 {stats["freed_bytes"] / 1024:.1f} KB')
+        LOGGER.info(f'日志清理完成: 删除 {stats["deleted"]} 个文件, 释放 {stats["freed_bytes"] / 1024:.1f} KB')
 
     return stats
 
 
-# 获取 logger 实例（延迟初始化，避免与 main 中的 global 冲突）
+# 获取 logger 实例（保留给外部调用，模块内部直接使用 LOGGER）
+# 首次调用时若尚未配置 handler，则按默认参数初始化（仅控制台输出）
 def get_logger() -> logging.Logger:
-    return logging.getLogger('typora-watch-dog-watch')
+    if not LOGGER.handlers:
+        setup_logger(log_to_file=False)
+    return LOGGER
 
 
-# 初始化日志系统
-setup_logger()
+# 模块级 logger 常量：各处直接使用，免去每次 getLogger 按名称查找
+# 导入时不配置 handler，由 main 按命令行参数初始化（外部调用方可通过 get_logger 初始化）
+LOGGER = logging.getLogger(LOGGER_NAME)
 
 
 # 防抖时间窗口（秒）
 DEBOUNCE_SECONDS = 10
+# 防抖记录的最大条数，超出后淘汰最久未访问的记录
+DEBOUNCE_MAX_ENTRIES = 10000
+
+# 编辑器临时文件的文件名前缀（.foo.md、.#foo.md、~foo.md）
+_TEMP_NAME_PREFIXES = ('.', '~')
+# 编辑器临时文件的文件名后缀（foo.md.tmp、foo.md~、.foo.md.swp）
+_TEMP_NAME_SUFFIXES = ('.tmp', '~', '.swp')
+
+# watchdog 分发层忽略的文件（编辑器的隐藏临时文件，如 .#foo.md、~foo.md）
+# 注：这些模式从路径末尾匹配，需要跳过的目录在 MarkdownEventHandler 中按路径检查
+WATCH_IGNORE_PATTERNS = ['*/.*', '*/~*']
+
+# 事件合并的安静时间（秒）：最后一个事件之后等待这么久才统一分发
+COALESCE_DELAY = 0.2
+
+# 跨监控移动的旧路径记录保留时间（秒）：旧路径的 deleted 事件应在此时间内到达
+MOVED_AWAY_TTL = 10
+
+# 需要跳过的文件名（单个预编译正则一次匹配全部规则）：
+# - 以 "Untitled" 开头（Typora 未命名的新建文件）
+# - 以 "~.md" 结尾（临时/备份文件，格式: test~.md）
+# - 包含 "冲突文件"
+_SKIP_RE = re.compile(r'^Untitled|~\.md$|冲突文件')
+# 匹配到的规则 -> 日志中显示的跳过原因
+_SKIP_REASONS = {
+    'Untitled': 'Untitled 文件',
+    '~.md': '临时/备份文件',
+    '冲突文件': '冲突文件',
+}
+
+# 读取 front matter 时最多读取的文件头字节数（front matter 总在文件开头的几 KB 内）
+FRONT_MATTER_READ_CAP = 8192
+
+
+def _read_front_matter(path: str, cap: int = FRONT_MATTER_READ_CAP) -> Optional[str]:
+    """
+    读取文件开头的 front matter（包含首尾的 --- 行）
+
+    只读取文件头 cap 字节并在 bytes 上查找结束标记，无论文件多大读取量都有上限，
+    找到后才解码截取的部分。
+
+    Args:
+        path: 文件路径
+        cap: 最多读取的字节数
+
+    Returns:
+        front matter 文本，文件头中没有完整的 front matter 时返回 None
+    """
+    with open(path, 'rb') as f:
+        head = f.read(cap)
+    if not head.startswith(b'---'):
+        return None
+    end = head.find(b'\n---', 3)
+    if end < 0:
+        return None
+    return head[:end + 4].decode('utf-8')
 
 
 class DebounceManager:
@@ -289,16 +497,23 @@ class DebounceManager:
     - 同一文件的 moved 事件 10 秒内只触发一次
     - 同一文件的 deleted 事件 10 秒内只触发一次
     - 同一文件的 modified 事件 10 秒内只触发一次
+
+    记录按最近访问顺序保存（LRU），最多保留 max_entries 条，长时间运行也不会无限增长；
+    时间使用 time.monotonic()，不受系统时间调整影响。
     """
 
-    def __init__(self, debounce_seconds: float = DEBOUNCE_SECONDS):
+    def __init__(self, debounce_seconds: float = DEBOUNCE_SECONDS, max_entries: int = DEBOUNCE_MAX_ENTRIES):
         """
         Args:
             debounce_seconds: 防抖时间窗口（秒）
+            max_entries: 防抖记录的最大条数
         """
         self.debounce_seconds = debounce_seconds
-        # {(event_type, file_path): last_timestamp}
-        self._last_processed: Dict[Tuple[str, str], float] = {}
+        self._max_entries = max_entries
+        # {(event_type, file_path): last_timestamp}，越靠后越是最近访问的记录
+        self._last_processed: OrderedDict[Tuple[str, str], float] = OrderedDict()
+        # 各事件类型的记录数，随记录的增删同步维护
+        self._type_counts: Counter = Counter()
 
     def should_process(self, event_type: str, file_path: str) -> bool:
         """
@@ -312,15 +527,25 @@ class DebounceManager:
             True 表示应该处理，False 表示在防抖期内应跳过
         """
         key = (event_type, file_path)
-        current_time = time.time()
-
-        last_time = self._last_processed.get(key, 0)
-        if current_time - last_time < self.debounce_seconds:
-            # 在防抖期内，跳过处理
-            return False
+        current_time = time.monotonic()
+
+        last_time = self._last_processed.get(key)
+        if last_time is not None:
+            # 命中已有记录，标记为最近访问
+            self._last_processed.move_to_end(key)
+            if current_time - last_time < self.debounce_seconds:
+                # 在防抖期内，跳过处理
+                return False
+        else:
+            self._type_counts[event_type] += 1
 
         # 更新最后处理时间
         self._last_processed[key] = current_time
+
+        # 超出上限时淘汰最久未访问的记录
+        if len(self._last_processed) > self._max_entries:
+            (evicted_type, _), _ = self._last_processed.popitem(last=False)
+            self._type_counts[evicted_type] -= 1
         return True
 
     def clear(self, file_path: str = None):
@@ -332,11 +557,13 @@ class DebounceManager:
         """
         if file_path is None:
             self._last_processed.clear()
+            self._type_counts.clear()
         else:
             # 清除指定文件的所有事件类型记录
             keys_to_remove = [k for k in self._last_processed if k[1] == file_path]
             for key in keys_to_remove:
                 del self._last_processed[key]
+                self._type_counts[key[0]] -= 1
 
     def get_info(self) -> dict:
         """获取防抖管理器状态信息"""
@@ -347,11 +574,8 @@ class DebounceManager:
         }
 
     def _count_by_type(self) -> Dict[str, int]:
-        """统计各事件类型的追踪数量"""
-        counts = defaultdict(int)
-        for event_type, _ in self._last_processed.keys():
-            counts[event_type] += 1
-        return dict(counts)
+        """统计各事件类型的追踪数量（直接读取同步维护的计数，无需遍历记录）"""
+        return {event_type: count for event_type, count in self._type_counts.items() if count}
 
 
 class MarkdownEventHandler:
@@ -360,28 +584,63 @@ class MarkdownEventHandler:
     def __init__(self, workspace_path: str, debounce_manager: DebounceManager = None):
         """
         Args:
-            workspace_path: 工作空间路径
+            workspace_path: 工作空间路径（绝对路径，main 中已规范化）
             debounce_manager: 防抖管理器实例
         """
-        self.workspace_path = os.path.abspath(workspace_path)
+        self.workspace_path = workspace_path
+        # 工作空间路径前缀（以分隔符结尾），判断事件路径是否在工作空间内只需一次 startswith
+        self._ws_prefix = os.path.join(self.workspace_path, '')
         self.debounce = debounce_manager or DebounceManager()
-        # 记录最近移动的文件 {dest_path: timestamp}
+        # 记录最近移动的文件 {dest_path: timestamp}，按记录时间从早到晚排列
         # 用于防止移动后立即触发的 created 事件
-        self._recently_moved: Dict[str, float] = {}
+        self._recently_moved: OrderedDict[str, float] = OrderedDict()
+        # 上次全量清理移动记录的时间
+        self._last_sweep = 0.0
 
-    def is_markdown_file(self, path: str) -> bool:
-        """检查是否为 Markdown 文件"""
-        return path.endswith('.md')
+    def _inside_ws(self, path: str) -> bool:
+        """
+        检查路径是否在工作空间内，且不在需要跳过的目录中
 
-    def should_skip_file(self, path: str) -> bool:
+        与索引脚本遍历工作空间的规则一致：跳过 SKIP_DIR_NAMES 中的目录和所有以 . 开头的隐藏目录
+        （watchdog 的 ignore_patterns 只能从路径末尾匹配，无法排除任意深度下的目录）
         """
-        检查文件是否应该跳过处理
+        if not path.startswith(self._ws_prefix):
+            return False
+        dir_names = path[len(self._ws_prefix):].split(os.sep)[:-1]
+        return not any(name.startswith('.') or name in SKIP_DIR_NAMES for name in dir_names)
 
-        跳过条件：
-        - 文件名以 "Untitled" 开头（Typora 未命名的新建文件）
-        - 文件名包含 "冲突文件"
+    @staticmethod
+    def is_markdown_file(path: str) -> bool:
+        """
+        检查是否为 Markdown 文件（排除编辑器的临时文件）
 
-        注：备份文件（格式: test~.md）在事件处理方法中直接检查，不在此处
+        以 .md 结尾即已排除 .md.swp、.md.tmp、.md~ 等临时文件；
+        另外排除文件名以 . 或 ~ 开头的临时文件（如 .foo.md、.#foo.md、~foo.md）
+        """
+        return path.endswith('.md') and not os.path.basename(path).startswith(_TEMP_NAME_PREFIXES)
+
+    @staticmethod
+    def is_temp_file(path: str) -> bool:
+        """检查是否为编辑器保存时使用的临时文件（如 .foo.md.tmp、foo.md~、.foo.md.swp）"""
+        name = os.path.basename(path)
+        return name.startswith(_TEMP_NAME_PREFIXES) or name.endswith(_TEMP_NAME_SUFFIXES)
+
+    def skip_reason(self, path: str) -> Optional[str]:
+        """
+        检查文件是否应该跳过处理，跳过条件见 _SKIP_RE
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            跳过原因（用于日志），None 表示可以处理
+        """
+        match = _SKIP_RE.search(os.path.basename(path))
+        return _SKIP_REASONS[match.group()] if match else None
+
+    def should_skip_file(self, path: str) -> bool:
+        """
+        检查文件是否应该跳过处理
 
         Args:
             path: 文件路径
@@ -389,57 +648,49 @@ class MarkdownEventHandler:
         Returns:
             True 表示应该跳过，False 表示可以处理
         """
-        filename = os.path.basename(path)
-        if filename.startswith('Untitled'):
-            return True
-        if '冲突文件' in filename:
-            return True
-        return False
+        return self.skip_reason(path) is not None
 
     def _cleanup_moved_records(self, current_time: float = None):
         """
         清理过期的移动记录
 
+        每个防抖窗口内最多清理一次，避免批量新建文件时每个事件都扫描全部记录；
+        记录按时间先后排列，遇到第一条未过期的记录即可停止。
+
         Args:
             current_time: 当前时间戳（如果为 None 则使用当前时间）
         """
         if current_time is None:
-            current_time = time.time()
+            current_time = time.monotonic()
+
+        if current_time - self._last_sweep < DEBOUNCE_SECONDS:
+            return
+        self._last_sweep = current_time
 
-        expired_keys = [
-            path for path, timestamp in self._recently_moved.items()
-            if current_time - timestamp >= DEBOUNCE_SECONDS
-        ]
-        for key in expired_keys:
-            del self._recently_moved[key]
+        while self._recently_moved:
+            path, timestamp = next(iter(self._recently_moved.items()))
+            if current_time - timestamp < DEBOUNCE_SECONDS:
+                break
+            del self._recently_moved[path]
 
     def handle_created(self, file_path: str):
         """处理新建文件"""
-        # 先检查是否为备份文件（格式: test~.md）
-        if os.path.basename(file_path).endswith('~.md'):
-            get_logger().info(f'[忽略][新建] 临时/备份文件: {file_path}')
-            return
-
-        if not self.is_markdown_file(file_path):
+        if not self._inside_ws(file_path):
             return
 
-        current_time = time.time()
-
         # 检查是否应该跳过
-        if self.should_skip_file(file_path):
-            filename = os.path.basename(file_path)
-            if filename.startswith('Untitled'):
-                get_logger().info(f'[忽略][新建] Untitled 文件: {file_path}')
-            elif '冲突文件' in filename:
-                get_logger().info(f'[忽略][新建] 冲突文件: {file_path}')
+        reason = self.skip_reason(file_path)
+        if reason is not None:
+            LOGGER.info('[忽略][新建] %s: %s', reason, file_path)
             return
 
+        current_time = time.monotonic()
+
         # 检查是否为最近移动的文件（防止移动后触发 created 事件）
-        moved_time = self._recently_moved.get(file_path, 0)
-        if current_time - moved_time < DEBOUNCE_SECONDS:
-            get_logger().debug(f'[移动-创建] 跳过移动后触发的 created 事件: {file_path}')
-            # 清除移动记录（已处理，无需保留）
-            self._recently_moved.pop(file_path, None)
+        # 记录无论是否过期都已用过，直接取出（过期记录顺带清除）
+        moved_time = self._recently_moved.pop(file_path, None)
+        if moved_time is not None and current_time - moved_time < DEBOUNCE_SECONDS:
+            LOGGER.debug('[移动-创建] 跳过移动后触发的 created 事件: %s', file_path)
             return
 
         # 清理过期的记录
@@ -447,160 +698,432 @@ class MarkdownEventHandler:
 
         # 防抖检查
         if not self.debounce.should_process('created', file_path):
-            get_logger().debug(f'[防抖] 跳过重复的 created 事件: {file_path}')
+            LOGGER.debug('[防抖] 跳过重复的 created 事件: %s', file_path)
             return
 
-        get_logger().info(f'检测到新建文件: {file_path}')
+        LOGGER.info('检测到新建文件: %s', file_path)
 
         try:
             modified = index_or_update_file(self.workspace_path, file_path)
             if modified:
-                get_logger().info(f'  ✓ 已添加 front matter 和索引')
+                LOGGER.info('  ✓ 已添加 front matter 和索引')
                 # 打印更新后的 front matter 内容
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        if content.startswith('---'):
-                            rest = content[4:]
-                            second_dash_start = rest.find('\n---')
-                            if second_dash_start != -1:
-                                front_matter_end = 4 + second_dash_start + 4
-                                front_matter = content[:front_matter_end]
-                                get_logger().info(f'  Front matter 内容:')
-                                for line in front_matter.split('\n'):
-                                    get_logger().info(f'    {line}')
+                    front_matter = _read_front_matter(file_path)
+                    if front_matter is not None:
+                        # 整段 front matter 作为一条日志输出，避免每行都走一遍格式化和 handler
+                        LOGGER.info('  Front matter 内容:\n' + '\n'.join('    ' + line for line in front_matter.splitlines()))
                 except Exception as e:
-                    get_logger().debug(f'  读取 front matter 失败: {e}')
+                    LOGGER.debug('  读取 front matter 失败: %s', e)
             else:
-                get_logger().info(f'  - 跳过（已有正确的 front matter）')
+                LOGGER.info('  - 跳过（已有正确的 front matter）')
         except Exception as e:
-            get_logger().error(f'  ✗ 处理失败: {e}')
+            LOGGER.error('  ✗ 处理失败: %s', e)
 
     def handle_moved(self, src_path: str, dest_path: str):
         """处理移动文件"""
-        # 先检查是否为备份文件（格式: test~.md）
-        if os.path.basename(dest_path).endswith('~.md'):
-            get_logger().info(f'[忽略][移动] 临时/备份文件: {src_path} → {dest_path}')
-            return
-
-        if not self.is_markdown_file(dest_path):
+        if not self._inside_ws(dest_path):
             return
 
         # 检查是否应该跳过
-        if self.should_skip_file(dest_path):
-            filename = os.path.basename(dest_path)
-            if filename.startswith('Untitled'):
-                get_logger().info(f'[忽略][移动] Untitled 文件: {src_path} → {dest_path}')
-            elif '冲突文件' in filename:
-                get_logger().info(f'[忽略][移动] 冲突文件: {src_path} → {dest_path}')
+        reason = self.skip_reason(dest_path)
+        if reason is not None:
+            LOGGER.info('[忽略][移动] %s: %s → %s', reason, src_path, dest_path)
             return
 
-        get_logger().info(f'检测到文件移动: {src_path} → {dest_path}')
+        LOGGER.info('检测到文件移动: %s → %s', src_path, dest_path)
 
         try:
-            # 先从索引中移除旧路径
-            remove_from_index(self.workspace_path, src_path)
-
             # 清除源路径的防抖记录（文件已不存在）
             self.debounce.clear(src_path)
 
             # 记录目标路径，防止后续触发 created 事件
-            self._recently_moved[dest_path] = time.time()
+            self._recently_moved[dest_path] = time.monotonic()
+            # 保持按记录时间排列，便于清理时提前停止
+            self._recently_moved.move_to_end(dest_path)
 
-            # 为新路径添加 front matter（会更新 serial 的路径）
-            modified = index_or_update_file(self.workspace_path, dest_path)
+            # 更新新路径的 front matter，并把索引记录从旧路径直接改指向新路径（只写一次索引）
+            modified = index_rename(self.workspace_path, src_path, dest_path)
             if modified:
-                get_logger().info(f'  ✓ 已更新索引')
+                LOGGER.info('  ✓ 已更新索引')
             else:
-                get_logger().info(f'  - 跳过（无需更新）')
+                LOGGER.info('  - 跳过（无需更新）')
         except Exception as e:
-            get_logger().error(f'  ✗ 处理失败: {e}')
+            LOGGER.error('  ✗ 处理失败: %s', e)
 
     def handle_deleted(self, file_path: str):
         """处理删除文件"""
-        # 先检查是否为备份文件（格式: test~.md）
-        if os.path.basename(file_path).endswith('~.md'):
-            get_logger().info(f'[忽略][删除] 临时/备份文件: {file_path}')
-            return
-
-        if not self.is_markdown_file(file_path):
+        if not self._inside_ws(file_path):
             return
 
         # 检查是否应该跳过
-        if self.should_skip_file(file_path):
-            filename = os.path.basename(file_path)
-            if filename.startswith('Untitled'):
-                get_logger().info(f'[忽略][删除] Untitled 文件: {file_path}')
-            elif '冲突文件' in filename:
-                get_logger().info(f'[忽略][删除] 冲突文件: {file_path}')
+        reason = self.skip_reason(file_path)
+        if reason is not None:
+            LOGGER.info('[忽略][删除] %s: %s', reason, file_path)
             return
 
-        get_logger().info(f'检测到删除文件: {file_path}')
+        LOGGER.info('检测到删除文件: %s', file_path)
 
         # 防抖检查
         if not self.debounce.should_process('deleted', file_path):
-            get_logger().debug(f'[防抖] 跳过重复的 deleted 事件: {file_path}')
+            LOGGER.debug('[防抖] 跳过重复的 deleted 事件: %s', file_path)
             return
 
         # 直接从索引中移除
         try:
             removed = remove_from_index(self.workspace_path, file_path)
             if removed:
-                get_logger().info(f'  ✓ 已从索引中移除')
+                LOGGER.info('  ✓ 已从索引中移除')
             else:
-                get_logger().info(f'  - 文件不在索引中')
+                LOGGER.info('  - 文件不在索引中')
         except Exception as e:
-            get_logger().error(f'  ✗ 处理失败: {e}')
+            LOGGER.error('  ✗ 处理失败: %s', e)
 
     def handle_modified(self, file_path: str):
         """处理文件修改（仅记录日志，不做操作）"""
-        # 先检查是否为备份文件（格式: test~.md）
-        if os.path.basename(file_path).endswith('~.md'):
-            get_logger().info(f'[忽略][修改] 临时/备份文件: {file_path}')
-            return
-
-        if not self.is_markdown_file(file_path):
+        if not self._inside_ws(file_path):
             return
 
         # 检查是否应该跳过
-        if self.should_skip_file(file_path):
-            filename = os.path.basename(file_path)
-            if filename.startswith('Untitled'):
-                get_logger().info(f'[忽略][修改] Untitled 文件: {file_path}')
-            elif '冲突文件' in filename:
-                get_logger().info(f'[忽略][修改] 冲突文件: {file_path}')
+        reason = self.skip_reason(file_path)
+        if reason is not None:
+            LOGGER.info('[忽略][修改] %s: %s', reason, file_path)
             return
 
-        get_logger().info(f'检测到文件修改: {file_path}')
+        LOGGER.info('检测到文件修改: %s', file_path)
 
         # 防抖检查
         if not self.debounce.should_process('modified', file_path):
-            get_logger().debug(f'[防抖] 跳过重复的 modified 事件: {file_path}')
+            LOGGER.debug('[防抖] 跳过重复的 modified 事件: %s', file_path)
             return
 
-        get_logger().info(f'  仅记录日志，不做处理')
+        LOGGER.info('  仅记录日志，不做处理')
+
+
+class EventCoalescer:
+    """
+    事件合并队列：把 watchdog 事件按文件路径合并后，由后台线程分发给 MarkdownEventHandler
+
+    watchdog 回调只负责入队，不在 watchdog 的分发线程中读写文件和索引，避免处理慢时积压事件。
+    编辑器保存时（先写临时文件再重命名）同一文件会在极短时间内产生多个事件，
+    最后一个事件之后安静 delay 秒才统一分发，每个路径只分发一次合并后的事件：
+    - 同一文件的多次 modified 合并为一次
+    - created 之后的 modified 不再单独分发；created 之后又 deleted 的临时文件直接丢弃
+    - deleted 之后又 created（替换写入）按 created 处理
+    - moved 作为该路径的最终状态：created 之后移动按目标路径的 created 处理，
+      连续移动合并为从最初源路径到最终目标路径的一次移动，移动后又删除按源路径的 deleted 处理
+    """
+
+    def __init__(self, handler: MarkdownEventHandler, delay: float = COALESCE_DELAY):
+        """
+        Args:
+            handler: Markdown 事件处理器实例
+            delay: 最后一个事件之后等待的安静时间（秒）
+        """
+        self.handler = handler
+        self.delay = delay
+        # {path: (event_type, src_path, dest_path)}，按首次入队顺序分发
+        self._pending: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        # {已按跨监控移动处理的旧路径: 记录时间}，用于丢弃随后到达的旧路径 deleted 事件（仅由后台线程访问）
+        self._moved_away: Dict[str, float] = {}
+        self._last_event = 0.0
+        self._lock = threading.Lock()
+        self._has_pending = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='event-coalescer', daemon=True)
+
+    def start(self):
+        """启动后台分发线程"""
+        self._worker.start()
+
+    def stop(self):
+        """停止后台分发线程，已入队的事件会先全部分发"""
+        self._stopping.set()
+        self._has_pending.set()
+        self._worker.join()
+
+    def submit(self, event_type: str, src_path: str, dest_path: str = None):
+        """
+        入队一个事件（由 watchdog 回调调用，只做合并不做处理）
+
+        Args:
+            event_type: 事件类型 ('created', 'moved', 'deleted', 'modified')
+            src_path: 文件路径（移动事件为源路径）
+            dest_path: 移动事件的目标路径
+        """
+        with self._lock:
+            pending = self._pending
+            if event_type == 'moved':
+                previous = pending.pop(src_path, None)
+                if previous is None or previous[0] in ('modified', 'deleted'):
+                    event = ('moved', src_path, dest_path)
+                elif previous[0] == 'created':
+                    # 新建后立即移动：对索引来说只是在目标路径新建了文件
+                    event = ('created', dest_path, None)
+                else:
+                    # 连续移动：从最初的源路径移动到最终的目标路径
+                    event = ('moved', previous[1], dest_path)
+                pending.pop(dest_path, None)
+                pending[dest_path] = event
+            else:
+                previous = pending.get(src_path)
+                if previous is None:
+                    pending[src_path] = (event_type, src_path, None)
+                elif event_type == 'deleted':
+                    if previous[0] == 'created':
+                        # 新建后又删除的临时文件，无需处理
+                        del pending[src_path]
+                    elif previous[0] == 'moved':
+                        # 移动后又删除：只需把源路径从索引中移除
+                        del pending[src_path]
+                        pending[previous[1]] = ('deleted', previous[1], None)
+                    else:
+                        pending[src_path] = ('deleted', src_path, None)
+                elif event_type == 'created' and previous[0] in ('deleted', 'modified'):
+                    # 删除后又新建（替换写入）
+                    pending[src_path] = ('created', src_path, None)
+                # 其余情况（已有 created/moved 记录时的 modified、created）由已有记录覆盖
+
+            self._last_event = time.monotonic()
+            self._has_pending.set()
+
+    def _run(self):
+        """后台线程：等待事件安静下来后批量分发，停止时分发剩余事件后退出"""
+        while True:
+            self._has_pending.wait()
 
+            # 等到最后一个事件之后安静 delay 秒（停止时不再等待）
+            while not self._stopping.is_set():
+                with self._lock:
+                    remaining = self._last_event + self.delay - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._stopping.wait(remaining)
 
-def write_pid_file(pid: int):
-    """写入 PID 文件"""
-    with open(PID_FILE, 'w') as f:
-        f.write(str(pid))
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._has_pending.clear()
 
+            for event_type, src_path, dest_path in self._pair_moves(batch):
+                self._dispatch(event_type, src_path, dest_path)
 
-def read_pid_file() -> Optional[int]:
-    """读取 PID 文件"""
-    if not os.path.exists(PID_FILE):
-        return None
+            if self._stopping.is_set():
+                with self._lock:
+                    if not self._pending:
+                        return
+
+    def _pair_moves(self, batch: Dict[str, Tuple[str, str, Optional[str]]]) -> list:
+        """
+        把跨监控移动产生的 created + deleted 还原为 moved
+
+        在不同监控之间移动文件时（见 WatchScheduler），watchdog 报告为旧路径 deleted + 新路径 created，
+        两者的先后和是否落在同一批都不确定（Linux 上 deleted 会比 created 晚约 0.5 秒）。
+        新文件 front matter 中的 serial 在索引中指向的旧路径已不存在时，按一次移动交给 handle_moved
+        （走 index_rename，与同一监控内的移动结果一致），并记下旧路径，之后到达的旧路径 deleted 直接丢弃。
+        旧路径仍然存在时（复制文件）照常按新建处理。
+
+        Returns:
+            按原顺序排列的事件列表
+        """
+        now = time.monotonic()
+        moved_away = self._moved_away
+        # 清理过期的记录（对应的 deleted 事件没有到达）
+        for path in [p for p, t in moved_away.items() if now - t > MOVED_AWAY_TTL]:
+            del moved_away[path]
+
+        events = []
+        for event in batch.values():
+            event_type, src_path, _ = event
+            if event_type == 'created':
+                try:
+                    old_path = find_indexed_path(self.handler.workspace_path, src_path)
+                except Exception as e:
+                    # 查找失败时按普通新建处理，不影响后台线程继续分发
+                    LOGGER.debug('  查找索引中的旧路径失败: %s: %s', src_path, e)
+                    old_path = None
+                if old_path is not None and old_path != src_path and not os.path.exists(old_path):
+                    moved_away[old_path] = now
+                    event = ('moved', old_path, src_path)
+            events.append(event)
+
+        # 已按移动处理的旧路径，其 deleted 事件无需再处理（可能在本批，也可能在之后的批次中到达）
+        result = []
+        for event in events:
+            if event[0] == 'deleted' and moved_away.pop(event[1], None) is not None:
+                LOGGER.debug('[移动-删除] 跳过跨监控移动的 deleted 事件: %s', event[1])
+                continue
+            result.append(event)
+        return result
+
+    def _dispatch(self, event_type: str, src_path: str, dest_path: Optional[str]):
+        """把合并后的事件交给 MarkdownEventHandler 处理，单个事件出错不影响后续事件"""
+        try:
+            if event_type == 'created':
+                self.handler.handle_created(src_path)
+            elif event_type == 'moved':
+                self.handler.handle_moved(src_path, dest_path)
+            elif event_type == 'deleted':
+                self.handler.handle_deleted(src_path)
+            else:
+                self.handler.handle_modified(src_path)
+        except Exception as e:
+            LOGGER.error('  ✗ 处理 %s 事件失败: %s: %s', event_type, src_path, e)
+
+
+class WatchScheduler:
+    """
+    按目录划分监控范围
+
+    对整个工作空间做一个递归监控时（Linux inotify 为每个子目录各加一个 watch），
+    .assets 下大量的图片目录、.git、node_modules 等不含需要处理的 Markdown 的目录也会被监控，
+    图片写入等事件都会唤醒监控线程。这里改为：
+    - 工作空间根目录：非递归监控，根目录下的 Markdown 文件事件交给 Markdown 事件适配器，
+      一级子目录的新建/删除/改名由本类处理（本类实现了 watchdog 所需的 dispatch 方法）
+    - 每个一级子目录：各自递归监控，跳过 SKIP_DIR_NAMES 和隐藏目录（与索引脚本遍历工作空间的规则一致）
+
+    注：不同监控之间（根目录与一级子目录之间、两个一级子目录之间）移动文件时，
+    两个监控各自只看到一半，watchdog 报告为源路径 deleted + 目标路径 created。
+    EventCoalescer._pair_moves 按文件中的 serial 把两者还原为一次 moved。
+    watchdog 的递归监控不能排除子目录，一级子目录内嵌套的 .assets 等目录仍会被监控，
+    这里只避免了工作空间根目录下的 .assets、.git、node_modules 等目录。
+    """
+
+    def __init__(self, observer, event_handler, workspace: str):
+        """
+        Args:
+            observer: watchdog 观察者实例
+            event_handler: Markdown 事件适配器（create_watchdog_handler 的返回值）
+            workspace: 工作空间绝对路径
+        """
+        self.observer = observer
+        self.event_handler = event_handler
+        self.workspace = workspace
+        # {一级子目录路径: ObservedWatch}
+        self._watches = {}
+
+    def schedule_all(self):
+        """为工作空间根目录和所有需要监控的一级子目录添加监控"""
+        self.observer.schedule(self.event_handler, self.workspace, recursive=False)
+        self.observer.schedule(self, self.workspace, recursive=False)
+        with os.scandir(self.workspace) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    self._add_watch(entry.path)
+
+    def dispatch(self, event):
+        """处理根目录下一级子目录的新建、删除和改名（由 watchdog 观察者调用）"""
+        if not event.is_directory:
+            return
+
+        if event.event_type == 'created':
+            if self._add_watch(event.src_path):
+                # 目录内在添加监控之前已存在的文件（如从工作空间外整体移入的目录）补发新建事件
+                for sub_event in generate_sub_created_events(event.src_path):
+                    self.event_handler.dispatch(sub_event)
+        elif event.event_type == 'deleted':
+            self._remove_watch(event.src_path)
+        elif event.event_type == 'moved':
+            self._remove_watch(event.src_path)
+            if os.path.dirname(event.dest_path) == self.workspace and self._add_watch(event.dest_path):
+                # 目录整体改名：为其中每个文件补发移动事件，更新 front matter 和索引
+                for sub_event in generate_sub_moved_events(event.src_path, event.dest_path):
+                    self.event_handler.dispatch(sub_event)
+
+    def _add_watch(self, path: str) -> bool:
+        """为一级子目录添加递归监控，返回是否需要监控该目录"""
+        name = os.path.basename(path)
+        if name.startswith('.') or name in SKIP_DIR_NAMES:
+            return False
+        if path not in self._watches:
+            self._watches[path] = self.observer.schedule(self.event_handler, path, recursive=True)
+        return True
+
+    def _remove_watch(self, path: str):
+        """移除一级子目录的监控（目录已被删除或改名）"""
+        watch = self._watches.pop(path, None)
+        if watch is not None:
+            try:
+                self.observer.unschedule(watch)
+            except KeyError:
+                pass
+
+
+def write_pid_file(pid: int, workspace: str) -> bool:
+    """
+    写入 PID 文件并加锁
+
+    文件内容为两行：PID 和工作空间路径（供 --status 显示，不依赖 /proc，macOS 上同样可用）
 
+    PID 文件以 fcntl.flock 加排他锁，文件句柄在进程整个生命周期内保持打开：
+    进程以任何方式退出（包括 SIGKILL、崩溃）时内核都会自动释放锁，
+    因此“PID 文件被锁住”即表示服务正在运行，不会因 PID 被复用而误判，也不怕遗留的 PID 文件。
+    加锁失败说明已有实例持有锁（单实例检查与写入是同一个原子操作）。
+    没有 fcntl 的平台（Windows）退回为直接写入。
+
+    Args:
+        pid: 进程 ID
+        workspace: 工作空间路径
+
+    Returns:
+        True 表示写入成功，False 表示已有实例在运行
+    """
+    global _pid_file_fd
+
+    content = f'{pid}\n{workspace}\n'
+    if fcntl is None:
+        with open(PID_FILE, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return True
+
+    # 不能以 'w' 打开：加锁之前截断文件会清掉正在运行的实例写入的 PID
+    fd = os.open(PID_FILE, os.O_RDWR | os.O_CREAT, 0o644)
     try:
-        with open(PID_FILE, 'r') as f:
-            return int(f.read().strip())
-    except (ValueError, IOError):
-        return None
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+
+    os.ftruncate(fd, 0)
+    os.write(fd, content.encode('utf-8'))
+    # 保持打开（即保持持有锁）直到进程退出
+    _pid_file_fd = fd
+    return True
+
+
+def read_pid_file() -> Tuple[Optional[int], Optional[str]]:
+    """
+    读取 PID 文件
+
+    PID 文件没有被锁住时说明写入它的进程已经退出（遗留文件），视为没有运行中的服务
+
+    Returns:
+        (PID, 工作空间路径)，没有运行中的服务时返回 (None, None)；
+        旧格式的 PID 文件只有 PID，此时工作空间路径为 None
+    """
+    try:
+        with open(PID_FILE, 'r', encoding='utf-8') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # 锁被运行中的服务持有
+                    pass
+                else:
+                    # 能加锁说明没有进程持有锁，关闭文件时自动释放
+                    return None, None
+            lines = f.read().splitlines()
+            return int(lines[0]), (lines[1] if len(lines) > 1 else None)
+    except (ValueError, IndexError, IOError):
+        return None, None
 
 
 def remove_pid_file():
-    """删除 PID 文件"""
+    """
+    删除 PID 文件
+
+    仅在没有 fcntl 的平台上使用：PID 文件加锁时，进程退出后锁自动释放，遗留的文件会被视为未运行，
+    无需删除；而且在进程尚未退出时删除文件会让新实例另建文件加锁，导致同时运行两个实例。
+    """
     if os.path.exists(PID_FILE):
         os.remove(PID_FILE)
 
@@ -654,81 +1177,154 @@ def is_running_as_system_service() -> bool:
     return False
 
 
+def wait_process_exit(pid: int, timeout: float) -> bool:
+    """
+    等待任意进程（不要求是当前进程的子进程）退出
+
+    进程退出时立即返回，不必按固定间隔轮询：
+    - Linux：os.pidfd_open 得到的 pidfd 在进程退出时变为可读，用 select 等待
+    - macOS/BSD：kqueue 监听 EVFILT_PROC 的 NOTE_EXIT 事件
+    - 都不可用时退回轮询，间隔从 10 毫秒开始按 1.5 倍递增（最长 0.2 秒），正常退出时很快就能发现
+
+    Args:
+        pid: 进程 ID
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        True 表示进程已退出，False 表示超时
+    """
+    if hasattr(os, 'pidfd_open'):
+        try:
+            pidfd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            # 内核不支持 pidfd（Linux < 5.3），退回轮询
+            pass
+        else:
+            try:
+                readable, _, _ = select.select([pidfd], [], [], timeout)
+                return bool(readable)
+            finally:
+                os.close(pidfd)
+    elif hasattr(select, 'kqueue'):
+        kq = select.kqueue()
+        try:
+            event = select.kevent(pid, filter=select.KQ_FILTER_PROC,
+                                  flags=select.KQ_EV_ADD | select.KQ_EV_ONESHOT,
+                                  fflags=select.KQ_NOTE_EXIT)
+            try:
+                return bool(kq.control([event], 1, timeout))
+            except ProcessLookupError:
+                return True
+        finally:
+            kq.close()
+
+    deadline = time.monotonic() + timeout
+    interval = 0.01
+    while is_process_running(pid):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, 0.2)
+    return True
+
+
 def stop_daemon():
     """停止后台运行的守护进程"""
-    pid = read_pid_file()
+    pid, _ = read_pid_file()
     if pid is None:
-        get_logger().info('未找到运行中的服务')
+        LOGGER.info('未找到运行中的服务')
         return False
 
     if not is_process_running(pid):
-        get_logger().info(f'服务已停止 (PID {pid} 不存在)')
-        remove_pid_file()
+        LOGGER.info(f'服务已停止 (PID {pid} 不存在)')
+        if fcntl is None:
+            remove_pid_file()
         return False
 
     try:
-        os.kill(pid, 15)  # SIGTERM
-        get_logger().info(f'已发送停止信号到进程 {pid}')
+        os.kill(pid, signal.SIGTERM)
+        LOGGER.info(f'已发送停止信号到进程 {pid}')
 
-        # 等待进程退出
-        for _ in range(50):  # 最多等待 5 秒
-            time.sleep(0.1)
-            if not is_process_running(pid):
-                break
+        # 等待进程退出（最多等待 STOP_TIMEOUT 秒）
+        if not wait_process_exit(pid, STOP_TIMEOUT):
+            LOGGER.warning(f'进程 {pid} 未在 {STOP_TIMEOUT} 秒内退出，服务可能仍在运行')
+            return False
 
-        remove_pid_file()
-        get_logger().info('服务已停止')
+        if fcntl is None:
+            remove_pid_file()
+        LOGGER.info('服务已停止')
         return True
     except Exception as e:
-        get_logger().error(f'停止服务失败: {e}')
+        LOGGER.error(f'停止服务失败: {e}')
         return False
 
 
 def create_observer():
     """创建文件系统观察者"""
     if Observer is None:
-        get_logger().error('未安装 watchdog 库，请运行: pip install watchdog')
+        LOGGER.error('未安装 watchdog 库，请运行: pip install watchdog')
         sys.exit(1)
     return Observer
 
 
-def create_watchdog_handler(md_handler: 'MarkdownEventHandler'):
+def create_watchdog_handler(event_queue: 'EventCoalescer'):
     """
     创建 watchdog 事件处理器
 
-    延迟定义 WatchdogEventHandler 类，避免模块导入时因 watchdog 未安装而失败
+    延迟定义 WatchdogEventHandler 类，避免模块导入时因 watchdog 未安装而失败；
+    类只在首次调用时定义一次，之后的调用直接复用
+
+    基于 PatternMatchingEventHandler，在 watchdog 的分发层就按 *.md 过滤并忽略目录事件和
+    WATCH_IGNORE_PATTERNS 中的临时文件，图片等非 Markdown 文件的事件不会进入 Python 回调
+    （移动事件的源或目标任一匹配即分发）。回调只把事件放入合并队列，由队列的后台线程处理。
 
     Args:
-        md_handler: Markdown 事件处理器实例
+        event_queue: 事件合并队列实例
 
     Returns:
         watchdog 事件处理器实例
     """
-    from watchdog.events import FileSystemEventHandler
+    global _watchdog_handler_class
+
+    if _watchdog_handler_class is None:
+        _watchdog_handler_class = _define_watchdog_handler_class()
+    return _watchdog_handler_class(event_queue)
+
 
-    class WatchdogEventHandler(FileSystemEventHandler):
+def _define_watchdog_handler_class():
+    """定义 watchdog 事件处理器适配器类（需要 watchdog 已安装）"""
+    class WatchdogEventHandler(PatternMatchingEventHandler):
         """watchdog 事件处理器适配器"""
 
-        def __init__(self, handler):
-            self.handler = handler
+        def __init__(self, event_queue):
+            super().__init__(patterns=['*.md'], ignore_patterns=WATCH_IGNORE_PATTERNS,
+                             ignore_directories=True, case_sensitive=True)
+            self.event_queue = event_queue
 
         def on_created(self, event):
-            if not event.is_directory:
-                self.handler.handle_created(event.src_path)
+            self.event_queue.submit('created', event.src_path)
 
         def on_moved(self, event):
-            if not event.is_directory:
-                self.handler.handle_moved(event.src_path, event.dest_path)
+            # 移动事件只要源或目标任一匹配就会分发，目标不是 Markdown 文件（或是临时文件）时在这里直接丢弃
+            dest_path = event.dest_path
+            if not MarkdownEventHandler.is_markdown_file(dest_path):
+                return
+            if MarkdownEventHandler.is_temp_file(event.src_path):
+                # 编辑器"写临时文件再替换"式的保存：对笔记来说只是内容被修改
+                self.event_queue.submit('modified', dest_path)
+                return
+            self.event_queue.submit('moved', event.src_path, dest_path)
 
         def on_deleted(self, event):
-            if not event.is_directory:
-                self.handler.handle_deleted(event.src_path)
+            self.event_queue.submit('deleted', event.src_path)
 
         def on_modified(self, event):
-            if not event.is_directory:
-                self.handler.handle_modified(event.src_path)
+            self.event_queue.submit('modified', event.src_path)
 
-    return WatchdogEventHandler(md_handler)
+    return WatchdogEventHandler
 
 
 def main():
@@ -783,6 +1379,9 @@ def main():
 
     args = parser.parse_args()
 
+    # 先启用控制台日志，文件日志在确定运行方式之后（守护进程模式下在 fork 之后）启用
+    setup_logger(log_to_file=False)
+
     # 检查并安装依赖（在任何操作之前）
     check_and_install_dependencies()
 
@@ -793,37 +1392,36 @@ def main():
 
     # 处理 --status
     if args.status:
-        pid = read_pid_file()
-        if pid and is_process_running(pid):
-            get_logger().info(f'服务正在运行 (PID: {pid})')
-            get_logger().info(f'工作空间: {os.readlink(f"/proc/{pid}/cwd") if os.path.exists(f"/proc/{pid}") else "未知"}')
+        pid, pid_workspace = read_pid_file()
+        if pid and (fcntl is not None or is_process_running(pid)):
+            LOGGER.info(f'服务正在运行 (PID: {pid})\n工作空间: {pid_workspace or "未知"}')
         else:
-            get_logger().info('服务未运行')
+            LOGGER.info('服务未运行')
         return
 
     # 获取工作空间路径
     workspace = args.workspace or os.getenv(TYPORA_WORKSPACE_ENV)
 
     if not workspace:
-        get_logger().error('未指定工作空间路径')
-        get_logger().error('请通过以下方式之一指定：')
-        get_logger().error(f'  1. 命令行参数: -w /path/to/workspace')
-        get_logger().error(f'  2. 环境变量: export {TYPORA_WORKSPACE_ENV}=/path/to/workspace')
+        LOGGER.error(
+            '未指定工作空间路径\n'
+            '请通过以下方式之一指定：\n'
+            '  1. 命令行参数: -w /path/to/workspace\n'
+            f'  2. 环境变量: export {TYPORA_WORKSPACE_ENV}=/path/to/workspace'
+        )
         sys.exit(1)
 
     workspace = os.path.abspath(workspace)
 
     if not os.path.isdir(workspace):
-        get_logger().error(f'工作空间路径不存在: {workspace}')
+        LOGGER.error(f'工作空间路径不存在: {workspace}')
         sys.exit(1)
 
     # 处理 --clean-logs（仅清理日志，不启动监控）
     if args.clean_logs:
-        get_logger().info(f'日志保留天数: {args.log_retention}')
-        get_logger().info(f'日志目录: {LOG_DIR}')
-        get_logger().info('')
+        LOGGER.info(f'日志保留天数: {args.log_retention}\n日志目录: {LOG_DIR}\n')
         stats = clean_old_logs(args.log_retention)
-        get_logger().info(f'\n清理完成: 删除 {stats["deleted"]} 个文件, 释放 {stats["freed_bytes"] / 1024:.1f} KB')
+        LOGGER.info(f'\n清理完成: 删除 {stats["deleted"]} 个文件, 释放 {stats["freed_bytes"] / 1024:.1f} KB')
         sys.exit(0)
 
     # 检测是否作为系统服务运行
@@ -832,79 +1430,91 @@ def main():
     # 检查是否已有实例运行（仅在非系统服务模式下）
     # 系统服务由 systemd/launchd 管理单例，无需脚本内部检查
     if not running_as_service:
-        existing_pid = read_pid_file()
-        if existing_pid and is_process_running(existing_pid):
-            get_logger().warning(f'服务已在运行 (PID: {existing_pid})')
-            get_logger().info('如需重启，请先使用 --stop 停止现有服务')
+        existing_pid, _ = read_pid_file()
+        # PID 文件加锁时 read_pid_file 只返回运行中服务的 PID，无需再用 kill(pid, 0) 确认
+        if existing_pid and (fcntl is not None or is_process_running(existing_pid)):
+            LOGGER.warning(f'服务已在运行 (PID: {existing_pid})')
+            LOGGER.info('如需重启，请先使用 --stop 停止现有服务')
             sys.exit(1)
 
     # 后台运行
     if args.daemon:
         if sys.platform == 'win32':
-            get_logger().error('Windows 系统请使用 NSSM 或任务计划程序安装为服务')
-            get_logger().info('参考文档: service-install/windows-nssm.md')
+            LOGGER.error('Windows 系统请使用 NSSM 或任务计划程序安装为服务')
+            LOGGER.info('参考文档: service-install/windows-nssm.md')
             sys.exit(1)
         else:
             # Unix-like 系统：使用 fork
             pid = os.fork()
             if pid > 0:
-                # 父进程退出
-                get_logger().info(f'服务已在后台启动 (PID: {pid})')
-                write_pid_file(pid)
+                # 父进程退出（PID 文件由子进程自己写入并加锁，父进程退出后锁仍然有效）
+                LOGGER.info(f'服务已在后台启动 (PID: {pid})')
                 sys.exit(0)
 
             # 子进程继续
             os.setsid()
             os.umask(0)
 
-    # 设置日志（重新初始化以应用命令行参数）
+    # 设置日志（按命令行参数启用文件日志；守护进程模式下在 fork 之后启动后台写盘线程）
     setup_logger(log_to_file=not args.no_log_file, log_retention_days=args.log_retention)
 
     # 写入 PID（仅在非系统服务模式下）
     # 系统服务由 systemd/launchd 管理进程，无需 PID 文件
     if not running_as_service:
-        atexit.register(remove_pid_file)
-        write_pid_file(os.getpid())
-
-    get_logger().info('=' * 50)
-    get_logger().info('Typora 工作空间文件监控服务')
-    get_logger().info('=' * 50)
-    get_logger().info(f'工作空间: {workspace}')
-    get_logger().info(f'PID: {os.getpid()}')
-    get_logger().info(f'运行模式: {"系统服务" if running_as_service else "手动运行"}')
-    get_logger().info(f'日志目录: {LOG_DIR}')
-    get_logger().info(f'日志文件: typora-watch-dog-watch.log (自动按日期轮转)')
-    get_logger().info(f'日志保留: {args.log_retention} 天')
-    get_logger().info(f'防抖窗口: {DEBOUNCE_SECONDS} 秒')
-    get_logger().info('')
+        # 加锁失败说明在上面的检查之后另一个实例抢先启动了
+        if not write_pid_file(os.getpid(), workspace):
+            LOGGER.warning(f'服务已在运行 (PID: {read_pid_file()[0]})')
+            sys.exit(1)
+        # PID 文件加锁时由内核在进程退出（包括被 SIGKILL 或崩溃）时释放锁，无需退出时删除文件
+        if fcntl is None:
+            atexit.register(remove_pid_file)
+
+    # 启动信息合并为一条日志输出
+    LOGGER.info('\n'.join([
+        '=' * 50,
+        'Typora 工作空间文件监控服务',
+        '=' * 50,
+        f'工作空间: {workspace}',
+        f'PID: {os.getpid()}',
+        f'运行模式: {"系统服务" if running_as_service else "手动运行"}',
+        f'日志目录: {LOG_DIR}',
+        f'日志文件: {_CURRENT_LOG_NAME} (自动按日期轮转)',
+        f'日志保留: {args.log_retention} 天',
+        f'防抖窗口: {DEBOUNCE_SECONDS} 秒',
+        '',
+    ]))
 
     # 创建防抖管理器和事件处理器
     debounce_manager = DebounceManager(debounce_seconds=DEBOUNCE_SECONDS)
     md_handler = MarkdownEventHandler(workspace, debounce_manager=debounce_manager)
+    event_queue = EventCoalescer(md_handler)
 
     # 创建 watchdog 事件处理器和观察者
     ObserverClass = create_observer()
-    watchdog_handler = create_watchdog_handler(md_handler)
+    watchdog_handler = create_watchdog_handler(event_queue)
 
     # 创建观察者
     observer = ObserverClass()
-    observer.schedule(watchdog_handler, workspace, recursive=True)
+    WatchScheduler(observer, watchdog_handler, workspace).schedule_all()
 
     # 启动监控
+    event_queue.start()
     observer.start()
-    get_logger().info('监控已启动，等待文件变化...')
-    get_logger().info('按 Ctrl+C 停止服务')
-    get_logger().info('')
+    LOGGER.info('监控已启动，等待文件变化...\n按 Ctrl+C 停止服务\n')
 
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        get_logger().info('')
-        get_logger().info('收到停止信号，正在关闭...')
+    def request_stop(signum, frame):
+        """收到停止信号时停止观察者，主线程随即从 observer.join() 返回"""
+        LOGGER.info('\n收到停止信号，正在关闭...')
         observer.stop()
-        observer.join()
-        get_logger().info('服务已停止')
+
+    # 主线程直接阻塞在 observer.join() 上，不再每秒唤醒一次；Ctrl+C 和 SIGTERM（--stop、systemd/launchd 停止服务）
+    # 都由信号处理函数停止观察者，随后正常退出（执行 atexit 清理，写完剩余日志）
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    observer.join()
+    # 观察者停止后不再有新事件，分发完队列中剩余的事件再退出
+    event_queue.stop()
+    LOGGER.info('服务已停止')
 
 
 if __name__ == '__main__':